@@ -1,17 +1,43 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, abort, g, session
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, g, session, make_response, send_from_directory, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_mail import Mail, Message
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_babel import Babel, gettext, ngettext, get_locale
+from flask_babel import Babel, gettext, ngettext, get_locale, force_locale
+from flask.cli import AppGroup
+import click
+from jinja2 import FileSystemBytecodeCache
+from blinker import Namespace
+from sqlalchemy.schema import CreateIndex
+from PIL import Image, ImageOps
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
+import re
+import mimetypes
 import uuid
 import secrets
+import random
+import heapq
+import time
+import threading
+import atexit
+import sys
+import json
+import hashlib
+import io
+import math
+import unicodedata
+import smtplib
+import tempfile
+import posixpath
+import subprocess
+from types import SimpleNamespace
+from xml.sax.saxutils import escape as xml_escape
+from collections import OrderedDict, Counter, defaultdict, deque, namedtuple
 from functools import wraps
 from config import config
 
@@ -53,6 +79,11 @@ limiter = Limiter(
 )
 limiter.init_app(app)
 
+@limiter.request_filter
+def _is_internal_request():
+    # Page cache revalidations replay visitor requests from 127.0.0.1; they must not use up its limits
+    return g.get('page_cache_revalidate', False)
+
 # Initialize Babel
 babel = Babel(app)
 
@@ -72,14 +103,51 @@ def get_locale():
     except RuntimeError:
         # Session not available (e.g., during app initialization)
         pass
-    # Check if language is set in request args
-    if request.args.get('lang'):
+    # Check if language is set in request args (only supported ones: the value is stored on new users)
+    if request.args.get('lang') in app.config['LANGUAGES']:
         return request.args.get('lang')
     # Default to English
     return 'en'
 
 babel.init_app(app, locale_selector=get_locale)
 
+# Jinja bytecode cache shared on disk by all workers
+jinja_cache_dir = app.config.get('JINJA_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+os.makedirs(jinja_cache_dir, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_dir)
+if app.config.get('TEMPLATES_AUTO_RELOAD') is False:
+    app.jinja_env.auto_reload = False
+
+# Static JavaScript modules: `flask assets build` writes minified, content-hashed copies to static/dist.
+# Templates link them through asset_url(), which falls back to the source file when no build exists.
+ASSET_SOURCES = ['js/core.js', 'js/home.js', 'js/register.js']
+asset_dist_dir = os.path.join(app.static_folder, 'dist')
+_asset_manifest = {'loaded': False, 'entries': {}}  # source path -> dist path
+
+def asset_manifest():
+    if not _asset_manifest['loaded'] or app.debug:
+        try:
+            with open(os.path.join(asset_dist_dir, 'manifest.json')) as f:
+                _asset_manifest['entries'] = json.load(f)
+        except (OSError, ValueError):
+            _asset_manifest['entries'] = {}
+        _asset_manifest['loaded'] = True
+    return _asset_manifest['entries']
+
+@app.template_global()
+def asset_url(filename):
+    """URL of the built copy of a static asset, or of the source file in an unbuilt checkout"""
+    return url_for('static', filename=asset_manifest().get(filename, filename))
+
+@app.after_request
+def cache_hashed_assets(response):
+    # Built files change name whenever their content changes, so browsers may keep them forever
+    if request.endpoint == 'static' and request.view_args.get('filename', '').startswith('dist/'):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
 def init_db():
     """Initialize database tables"""
     try:
@@ -148,6 +216,16 @@ def initialize_database():
         success = init_db()
         if success:
             create_default_admin()
+            if Country.query.first() is None:
+                countries, _ = load_countries()
+                print(f"✅ Loaded {countries} countries")
+            if University.query.first() is None:
+                universities, domains = load_universities()
+                print(f"✅ Loaded {universities} universities and {domains} email domains")
+            else:
+                load_university_domain_index()
+            if FeaturedSlot.query.first() is None:
+                refresh_featured()
             print("✅ Database initialization completed successfully!")
         else:
             print("⚠️  Database initialization had issues but continuing...")
@@ -173,10 +251,14 @@ class User(UserMixin, db.Model):
     
     # Member fields
     university = db.Column(db.String(100), nullable=True)
-    university_country = db.Column(db.String(100), nullable=True)
+    university_id = db.Column(db.Integer, db.ForeignKey('university.id'), nullable=True, index=True)  # matched from email domain
+    university_country = db.Column(db.String(100), nullable=True)  # canonical Country.name when recognised
+    university_country_id = db.Column(db.Integer, db.ForeignKey('country.id'), nullable=True, index=True)
     major = db.Column(db.String(100), nullable=True)
     start_date = db.Column(db.String(7), nullable=True)  # MM-YYYY format
     end_date = db.Column(db.String(7), nullable=True)  # MM-YYYY format
+    study_start = db.Column(db.Date, nullable=True)  # first day of start_date's month, for cohort queries
+    study_end = db.Column(db.Date, nullable=True)  # first day of end_date's month
     is_current_student = db.Column(db.Boolean, default=False)
     current_company = db.Column(db.String(100), nullable=True)
     current_position = db.Column(db.String(100), nullable=True)
@@ -192,21 +274,25 @@ class User(UserMixin, db.Model):
     
     # Additional
     personal_website = db.Column(db.String(200), nullable=True)
-    photo_filename = db.Column(db.String(200), nullable=True)
-    cv_filename = db.Column(db.String(200), nullable=True)
+    photo_filename = db.Column(db.String(200), nullable=True, index=True)
+    cv_filename = db.Column(db.String(200), nullable=True, index=True)
     
     # Company fields
     company_name = db.Column(db.String(100), nullable=True)
-    company_country = db.Column(db.String(100), nullable=True)
+    company_country = db.Column(db.String(100), nullable=True)  # canonical Country.name when recognised
+    company_country_id = db.Column(db.Integer, db.ForeignKey('country.id'), nullable=True, index=True)
     industry = db.Column(db.String(100), nullable=True)
     
     date_joined = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+    updated_at = db.Column(db.DateTime, nullable=True, default=lambda: datetime.utcnow())  # last public profile change (sitemap lastmod)
     is_active = db.Column(db.Boolean, default=True)
     is_admin = db.Column(db.Boolean, default=False)
     is_verified = db.Column(db.Boolean, default=False)
     verification_token = db.Column(db.String(100), nullable=True)
     reset_token = db.Column(db.String(100), nullable=True)
     reset_token_expires = db.Column(db.DateTime, nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default=db.text('1'))  # bumped by every profile edit
+    language = db.Column(db.String(5), nullable=True)  # last UI language chosen, used for emails
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -233,10 +319,180 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
 
+# Country reference data keyed by ISO 3166-1 alpha-2 code, with lowercase aliases ("usa", "uk", ...)
+class Country(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(2), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+
+    def __repr__(self):
+        return f'<Country {self.code}>'
+
+class CountryAlias(db.Model):
+    alias = db.Column(db.String(100), primary_key=True)  # normalize_country_key() form
+    country_id = db.Column(db.Integer, db.ForeignKey('country.id'), nullable=False, index=True)
+
+# University reference data (loaded from static/world_universities_and_domains.json)
+class University(db.Model):
+    __table_args__ = (db.Index('ix_university_country_name', 'country', 'name'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    country = db.Column(db.String(100), nullable=True)
+    alpha_two_code = db.Column(db.String(2), nullable=True)
+    web_page = db.Column(db.String(200), nullable=True)
+
+    def __repr__(self):
+        return f'<University {self.name}>'
+
+class UniversityDomain(db.Model):
+    domain = db.Column(db.String(255), primary_key=True)
+    university_id = db.Column(db.Integer, db.ForeignKey('university.id'), nullable=False, index=True)
+
+# Homepage featured rotation snapshot
+class FeaturedSlot(db.Model):
+    __table_args__ = (db.Index('uq_featured_slot_slot_position', 'slot', 'position', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    slot = db.Column(db.String(20), nullable=False)  # 'hero', 'member', 'company'
+    position = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    
+    # Denormalized display fields so the homepage never reads the user table
+    full_name = db.Column(db.String(100), nullable=True)
+    company_name = db.Column(db.String(100), nullable=True)
+    photo_filename = db.Column(db.String(200), nullable=True)
+    current_position = db.Column(db.String(100), nullable=True)
+    current_company = db.Column(db.String(100), nullable=True)
+    major = db.Column(db.String(100), nullable=True)
+    university = db.Column(db.String(100), nullable=True)
+    university_country = db.Column(db.String(100), nullable=True)
+    refreshed_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+    
+    # Hero avatars come from one shared sprite; these are CSS background-size/-position for this tile
+    sprite = db.Column(db.String(100), nullable=True)
+    sprite_size = db.Column(db.String(20), nullable=True)
+    sprite_position = db.Column(db.String(20), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.user_id,
+            'full_name': self.full_name,
+            'company_name': self.company_name,
+            'photo_filename': self.photo_filename,
+            'current_position': self.current_position,
+            'current_company': self.current_company,
+            'major': self.major,
+            'university': self.university,
+            'university_country': self.university_country,
+            'sprite': self.sprite,
+            'sprite_size': self.sprite_size,
+            'sprite_position': self.sprite_position
+        }
+
+# Directory facet counts, maintained incrementally on every profile write
+class FacetCount(db.Model):
+    __table_args__ = (db.Index('ix_facet_count_facet_count', 'facet', 'count'),)
+
+    facet = db.Column(db.String(30), primary_key=True)  # User column name, e.g. 'university_country'
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# "Members you may know": inverted index of profile attributes and precomputed top-K lists
+class MemberAttribute(db.Model):
+    __table_args__ = (db.Index('ix_member_attribute_attribute_value', 'attribute', 'value'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    attribute = db.Column(db.String(30), nullable=False)  # 'university', 'major', 'university_country', 'current_company', 'year'
+    value = db.Column(db.String(100), nullable=False)
+
+class SimilarMember(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    similar_user = db.relationship('User', foreign_keys=[similar_user_id], lazy='joined')
+
+# Append-only audit log of admin and account-security actions
+class AuditLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_audit_log_action_created', 'action', 'created_at'),
+        db.Index('ix_audit_log_target_created', 'target_user_id', 'created_at'),
+        db.Index('ix_audit_log_actor_created', 'actor_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    action = db.Column(db.String(50), nullable=False)  # e.g. 'user.deactivate', 'password.reset'
+    actor_id = db.Column(db.Integer, nullable=True)  # no foreign keys: the log outlives the rows it mentions
+    target_user_id = db.Column(db.Integer, nullable=True)
+    ip_address = db.Column(db.String(45), nullable=True)
+    details = db.Column(db.Text, nullable=True)
+
+# Profile views per day, written in batches from per-worker counters
+class ProfileViewDaily(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+# Admin email broadcasts and their per-recipient delivery status
+class Broadcast(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    audience = db.Column(db.Text, nullable=False)  # JSON admin user filters, e.g. {"user_type": "member", "is_verified": "1"}
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, paused, done
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    # Progress checkpoint: recipients are sent in user id order, so a resume continues after last_user_id
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)
+    checkpoint_at = db.Column(db.DateTime, nullable=True)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+class BroadcastRecipient(db.Model):
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('broadcast.id'), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(10), nullable=False)  # sent, failed
+    error = db.Column(db.String(300), nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=False)
+
+class SiteStat(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+
+# Indexes backing the admin user filters and sorts
+# Companies register with full_name='', so an empty name falls through to the company name
+user_display_name = db.func.lower(db.func.coalesce(db.func.nullif(User.full_name, ''), User.company_name, ''))
+db.Index('ix_user_email_lower', db.func.lower(User.email))
+db.Index('ix_user_full_name_lower', db.func.lower(User.full_name))
+db.Index('ix_user_company_name_lower', db.func.lower(User.company_name))
+db.Index('ix_user_sort_name', user_display_name)
+db.Index('ix_user_date_joined', User.date_joined)
+db.Index('ix_user_type_active_joined', User.user_type, User.is_active, User.date_joined)
+db.Index('ix_user_university_country', User.university_country)
+db.Index('ix_user_company_country', User.company_country)
+db.Index('ix_user_type_study_end', User.user_type, User.study_end)  # "graduating in 2026"
+db.Index('ix_user_type_study_start', User.user_type, User.study_start)  # "studied 2018-2022"
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+def dialect_insert(table):
+    """INSERT for the bound database that supports ON CONFLICT upserts (PostgreSQL and SQLite)"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -291,68 +547,1157 @@ def send_password_reset_email(user):
     
     return send_email(user.email, 'Password Reset - Uzbek Global Network', template)
 
+# University affiliation
+_university_domains = {'loaded_at': None, 'index': {}}  # domain -> university id, reloaded every UNIVERSITY_INDEX_TTL
+
+def load_university_domain_index():
+    """Load the domain -> university hash index into memory"""
+    _university_domains['index'] = dict(db.session.query(UniversityDomain.domain, UniversityDomain.university_id).all())
+    _university_domains['loaded_at'] = time.monotonic()
+    return len(_university_domains['index'])
+
+def match_university(email):
+    """Return the university id for an email address, matching subdomains (cs.mit.edu -> mit.edu)"""
+    loaded_at = _university_domains['loaded_at']
+    # Another process may have run 'flask load-universities' since this worker loaded the index
+    if loaded_at is None or time.monotonic() - loaded_at >= app.config['UNIVERSITY_INDEX_TTL']:
+        load_university_domain_index()
+    domain = (email or '').rsplit('@', 1)[-1].strip().lower().rstrip('.')
+    labels = domain.split('.')
+    for i in range(len(labels) - 1):
+        university_id = _university_domains['index'].get('.'.join(labels[i:]))
+        if university_id:
+            return university_id
+    return None
+
+def load_universities(path=None):
+    """Upsert the bundled university dataset and rebuild the domain index"""
+    path = path or os.path.join(app.static_folder, 'world_universities_and_domains.json')
+    with open(path, encoding='utf-8') as f:
+        records = json.load(f)
+    
+    existing = {(u.name, u.country): u for u in University.query.all()}
+    for record in records:
+        key = (record['name'][:200], record.get('country'))
+        if key not in existing:
+            university = University(name=key[0], country=key[1])
+            db.session.add(university)
+            existing[key] = university
+        university = existing[key]
+        university.alpha_two_code = record.get('alpha_two_code')
+        university.web_page = (record.get('web_pages') or [None])[0]
+    db.session.flush()
+    
+    # Domains shared by several campuses link to the first one listed
+    domains = {}
+    for record in records:
+        university = existing[(record['name'][:200], record.get('country'))]
+        for domain in record.get('domains') or []:
+            domains.setdefault(domain.strip().lower(), university.id)
+    UniversityDomain.query.delete()
+    db.session.add_all(UniversityDomain(domain=domain, university_id=university_id) for domain, university_id in domains.items())
+    db.session.commit()
+    
+    load_university_domain_index()
+    return len(existing), len(domains)
+
+def backfill_universities(batch_size=1000):
+    """Link existing members without a university to one by their email domain; returns the number linked"""
+    load_university_domain_index()
+    linked, last_id = 0, 0
+    while True:
+        batch = User.query.filter(User.user_type == 'member', User.university_id.is_(None),
+                                  User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not batch:
+            break
+        for user in batch:
+            last_id = user.id
+            user.university_id = match_university(user.email)
+            if user.university_id:
+                linked += 1
+        db.session.commit()
+    return linked
+
+# Countries
+# Display names where the university dataset uses the formal name, plus countries it has no universities for
+COUNTRY_NAMES = {
+    'BN': 'Brunei', 'BO': 'Bolivia', 'CD': 'Democratic Republic of the Congo', 'CV': 'Cabo Verde', 'FM': 'Micronesia',
+    'GW': 'Guinea-Bissau', 'KI': 'Kiribati', 'KM': 'Comoros', 'KP': 'North Korea', 'KR': 'South Korea', 'LA': 'Laos',
+    'MD': 'Moldova', 'MH': 'Marshall Islands', 'NR': 'Nauru', 'PS': 'Palestine', 'PW': 'Palau', 'RU': 'Russia',
+    'SB': 'Solomon Islands', 'ST': 'Sao Tome and Principe', 'SY': 'Syria', 'SZ': 'Eswatini', 'TL': 'Timor-Leste',
+    'TO': 'Tonga', 'TR': 'Turkey', 'TV': 'Tuvalu', 'TW': 'Taiwan', 'TZ': 'Tanzania', 'VA': 'Vatican City',
+    'VE': 'Venezuela', 'VN': 'Vietnam', 'VU': 'Vanuatu'
+}
+COUNTRY_ALIASES = {
+    'US': ['usa', 'us', 'u.s.', 'u.s.a.', 'united states of america', 'america'],
+    'GB': ['uk', 'u.k.', 'great britain', 'britain', 'england', 'scotland', 'wales', 'northern ireland'],
+    'KR': ['korea', 'republic of korea'],
+    'KP': ['dprk', "democratic people's republic of korea"],
+    'CZ': ['czechia'],
+    'AE': ['uae'],
+    'NL': ['holland', 'the netherlands'],
+    'BA': ['bosnia'],
+    'TR': ['turkiye'],
+    'CI': ['ivory coast', "cote d'ivoire"],
+    'MK': ['macedonia'],
+    'CN': ['prc', "people's republic of china"],
+    'DE': ['deutschland'],
+    'UZ': ["o'zbekiston", 'uzbekiston']
+}
+
+_country_index = {'loaded_at': None, 'index': {}}  # alias -> (country id, name), reloaded every COUNTRY_INDEX_TTL
+
+# Typographic apostrophes and the Uzbek okina (Oʻzbekiston) map to ASCII before the fold would drop them
+_apostrophes = str.maketrans({'\u2018': "'", '\u2019': "'", '\u02bb': "'", '\u02bc': "'"})
+
+def normalize_country_key(value):
+    """Lowercase, accent-free, single-spaced form of a country string used for alias lookups"""
+    value = (value or '').translate(_apostrophes)
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(value.lower().split())
+
+def load_countries(path=None):
+    """Upsert countries and aliases from the bundled university dataset plus COUNTRY_NAMES / COUNTRY_ALIASES"""
+    path = path or os.path.join(app.static_folder, 'world_universities_and_domains.json')
+    with open(path, encoding='utf-8') as f:
+        records = json.load(f)
+    
+    names = {}
+    for record in records:
+        code = (record.get('alpha_two_code') or '').upper()
+        if len(code) == 2 and record.get('country'):
+            names.setdefault(code, set()).add(record['country'])
+    for code, name in COUNTRY_NAMES.items():
+        names.setdefault(code, set()).add(name)
+    
+    existing = {country.code: country for country in Country.query.all()}
+    for code, variants in names.items():
+        country = existing.get(code)
+        if country is None:
+            country = existing[code] = Country(code=code)
+            db.session.add(country)
+        country.name = COUNTRY_NAMES.get(code) or sorted(variants)[0]
+    db.session.flush()
+    
+    aliases = {}
+    for code, country in existing.items():
+        for alias in [code, country.name, *names.get(code, ()), *COUNTRY_ALIASES.get(code, ())]:
+            aliases.setdefault(normalize_country_key(alias), country.id)
+    CountryAlias.query.delete()
+    db.session.add_all(CountryAlias(alias=alias, country_id=country_id) for alias, country_id in aliases.items())
+    db.session.commit()
+    
+    load_country_index()
+    return len(existing), len(aliases)
+
+def load_country_index():
+    """Load the alias -> (country id, name) hash index into memory"""
+    rows = db.session.query(CountryAlias.alias, Country.id, Country.name).join(Country, Country.id == CountryAlias.country_id)
+    _country_index['index'] = {alias: (country_id, name) for alias, country_id, name in rows}
+    _country_index['loaded_at'] = time.monotonic()
+    return len(_country_index['index'])
+
+def match_country(value):
+    """Return (country id, canonical name) for a free-text country, or (None, stripped text) if unrecognised"""
+    loaded_at = _country_index['loaded_at']
+    # Another process may have run 'flask load-countries' since this worker loaded the index
+    if loaded_at is None or time.monotonic() - loaded_at >= app.config['COUNTRY_INDEX_TTL']:
+        load_country_index()
+    text = ' '.join((value or '').split()) or None
+    match = _country_index['index'].get(normalize_country_key(text)) if text else None
+    return match or (None, text)
+
+COUNTRY_COLUMNS = {'university_country': 'university_country_id', 'company_country': 'company_country_id'}
+
+def country_changes(values):
+    """Normalize any country strings in a {field: value} dict, adding the matching *_country_id fields"""
+    normalized = {}
+    for field, value in values.items():
+        if field in COUNTRY_COLUMNS:
+            country_id, name = match_country(value)
+            normalized[COUNTRY_COLUMNS[field]] = country_id
+            value = name
+        normalized[field] = value
+    return normalized
+
+def country_condition(field, value):
+    """Filter on a country column by its indexed id, falling back to the raw string for unrecognised values"""
+    country_id, name = match_country(value)
+    if country_id is not None:
+        return getattr(User, COUNTRY_COLUMNS[field]) == country_id
+    return getattr(User, field) == name
+
+def backfill_countries(batch_size=1000):
+    """Map existing country strings to Country rows; returns (updated, Counter of unrecognised values)"""
+    load_country_index()
+    updated, unmatched, last_id = 0, Counter(), 0
+    pending = db.or_(*(db.and_(getattr(User, field).isnot(None), getattr(User, field) != '', getattr(User, id_field).is_(None))
+                       for field, id_field in COUNTRY_COLUMNS.items()))
+    while True:
+        batch = User.query.filter(User.id > last_id, pending).order_by(User.id).limit(batch_size).all()
+        if not batch:
+            break
+        for user in batch:
+            last_id = user.id
+            values = {field: getattr(user, field) for field in COUNTRY_COLUMNS if getattr(user, field)}
+            normalized = country_changes(values)
+            for field, value in normalized.items():
+                setattr(user, field, value)
+            for field in values:
+                if normalized[COUNTRY_COLUMNS[field]] is None:
+                    unmatched[normalized[field]] += 1
+            if any(normalized[COUNTRY_COLUMNS[field]] is not None for field in values):
+                updated += 1
+        db.session.commit()
+    return updated, unmatched
+
+# Directory facets
+FACETS = {
+    'member': ['university_country', 'university', 'major'],
+    'company': ['company_country', 'industry']
+}
+FACET_SIDEBAR_SIZE = 10
+# Free-text facets backed by a reference table: linked users are counted under the integer key
+# (facet 'university_id', value '<id>'); only unlinked users fall back to grouping on the text
+FACET_KEYS = {'university': ('university_id', University)}
+
+FacetRow = namedtuple('FacetRow', ['param', 'value', 'label', 'count'])
+
+def facet_values(user):
+    """Return the (facet, value) pairs a user contributes to the directory counts"""
+    if not user.is_active or user.is_admin or user.user_type not in FACETS:
+        return set()
+    values = set()
+    for facet in FACETS[user.user_type]:
+        if facet in FACET_KEYS and getattr(user, FACET_KEYS[facet][0]):
+            key = FACET_KEYS[facet][0]
+            values.add((key, str(getattr(user, key))))
+            continue
+        value = (getattr(user, facet) or '').strip()
+        if value:
+            values.add((facet, value))
+    return values
+
+def update_facets(before, after):
+    """Apply the difference between two facet_values() snapshots to the counts table"""
+    changes = [(pair, -1) for pair in before - after] + [(pair, 1) for pair in after - before]
+    if not changes:
+        return
+    # One upsert, so concurrent writers adding the first user with a value can't both INSERT
+    statement = dialect_insert(FacetCount.__table__)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['facet', 'value'],
+        set_={'count': FacetCount.__table__.c.count + statement.excluded.count}
+    ), [{'facet': facet, 'value': value, 'count': delta} for (facet, value), delta in changes])
+    if any(delta < 0 for _, delta in changes):
+        FacetCount.query.filter(FacetCount.count <= 0).delete(synchronize_session=False)
+
+def rebuild_facets():
+    """Recompute every facet count from the user table"""
+    FacetCount.query.delete()
+    total = 0
+    for user_type, facets in FACETS.items():
+        for facet in facets:
+            column = getattr(User, facet)
+            query = db.session.query(column, db.func.count(User.id)).filter(
+                User.is_active == True,
+                User.is_admin == False,
+                User.user_type == user_type,
+                column.isnot(None),
+                column != ''
+            )
+            if facet in FACET_KEYS:
+                key = getattr(User, FACET_KEYS[facet][0])
+                keyed = db.session.query(key, db.func.count(User.id)).filter(
+                    User.is_active == True,
+                    User.is_admin == False,
+                    User.user_type == user_type,
+                    key.isnot(None)
+                ).group_by(key).all()
+                db.session.add_all(FacetCount(facet=FACET_KEYS[facet][0], value=str(key_id), count=count)
+                                   for key_id, count in keyed)
+                total += len(keyed)
+                query = query.filter(key.is_(None)).group_by(column)
+            elif facet in COUNTRY_COLUMNS:
+                # Recognised countries group on the integer key and are labelled with the canonical name
+                country_id = getattr(User, COUNTRY_COLUMNS[facet])
+                query = query.outerjoin(Country, Country.id == country_id).with_entities(
+                    db.func.coalesce(Country.name, column), db.func.count(User.id)
+                ).group_by(country_id, db.case((country_id.is_(None), column)))
+            else:
+                query = query.group_by(column)
+            rows = query.all()
+            
+            counts = {}
+            for value, count in rows:
+                value = value.strip()
+                if value:
+                    counts[value] = counts.get(value, 0) + count
+            db.session.add_all(FacetCount(facet=facet, value=value, count=count) for value, count in counts.items())
+            total += len(counts)
+    db.session.commit()
+    return total
+
+def get_facet_sidebar(user_type):
+    """Return the top FacetRows per facet for a directory page; keyed rows link by id and show the reference name"""
+    sidebar = {}
+    for facet in FACETS[user_type]:
+        key, model = FACET_KEYS.get(facet, (None, None))
+        rows = FacetCount.query.filter(FacetCount.facet.in_([facet, key] if key else [facet])).order_by(
+            FacetCount.count.desc(), FacetCount.value
+        ).limit(FACET_SIDEBAR_SIZE).all()
+        ids = [int(row.value) for row in rows if row.facet == key]
+        names = dict(db.session.query(model.id, model.name).filter(model.id.in_(ids)).all()) if ids else {}
+        sidebar[facet] = [
+            FacetRow(key, int(row.value), names.get(int(row.value), row.value), row.count) if row.facet == key
+            else FacetRow(facet, row.value, row.value, row.count)
+            for row in rows
+        ]
+    return sidebar
+
+def get_facet_filters(user_type):
+    """Read the active facet filters for a directory page from the query string"""
+    filters = {facet: request.args[facet] for facet in FACETS[user_type] if request.args.get(facet)}
+    for facet in FACETS[user_type]:
+        if facet in FACET_KEYS and request.args.get(FACET_KEYS[facet][0], type=int):
+            filters[FACET_KEYS[facet][0]] = request.args.get(FACET_KEYS[facet][0], type=int)
+    return filters
+
+def facet_filter_labels(filters):
+    """Display names for active keyed filters, e.g. {'university_id': 'Massachusetts Institute of Technology'}"""
+    labels = {}
+    for key, model in FACET_KEYS.values():
+        if key in filters:
+            record = db.session.get(model, filters[key])
+            labels[key] = record.name if record else filters[key]
+    return labels
+
+def facet_conditions(filters):
+    """SQL conditions for directory filters; country facets match on the indexed country id"""
+    conditions = []
+    for field, value in filters.items():
+        if field in COUNTRY_COLUMNS:
+            conditions.append(country_condition(field, value))
+        elif field in FACET_KEYS:
+            # Matches the text-grouped facet rows, which only count users without a linked record
+            conditions.append(db.and_(getattr(User, field) == value, getattr(User, FACET_KEYS[field][0]).is_(None)))
+        else:
+            conditions.append(getattr(User, field) == value)
+    return conditions
+
+# Study periods
+STUDY_YEAR_MIN = 1950
+_study_month_pattern = re.compile(r'(?P<month>\d{1,2})[-/.](?P<year>\d{4})|(?P<year_first>\d{4})[-/.](?P<month_last>\d{1,2})')
+
+def parse_study_month(value):
+    """Parse 'MM-YYYY' (or 'MM/YYYY', 'YYYY-MM') into the first day of that month; raises ValueError"""
+    match = _study_month_pattern.fullmatch((value or '').strip())
+    if not match:
+        raise ValueError(f"{value!r} is not a month in MM-YYYY format")
+    month = int(match['month'] or match['month_last'])
+    year = int(match['year'] or match['year_first'])
+    if not 1 <= month <= 12 or not STUDY_YEAR_MIN <= year <= datetime.utcnow().year + 10:
+        raise ValueError(f"{value!r} is out of range")
+    return date(year, month, 1)
+
+def study_period(start_value, end_value, is_current_student=False):
+    """Validate submitted study dates, returning the canonical string and typed columns to store"""
+    start = parse_study_month(start_value)
+    end = None
+    if (end_value or '').strip():
+        end = parse_study_month(end_value)
+        if end < start:
+            raise ValueError('the end date is before the start date')
+    elif not is_current_student:
+        raise ValueError('an end date is required unless you are a current student')
+    return {
+        'start_date': start.strftime('%m-%Y'),
+        'end_date': end.strftime('%m-%Y') if end else None,
+        'study_start': start,
+        'study_end': end
+    }
+
+COHORT_FILTERS = ('graduating', 'studied_from', 'studied_to')
+
+def get_cohort_filters():
+    """Read cohort years (graduation year, or a studied-between range) from the query string"""
+    filters = {}
+    for name in COHORT_FILTERS:
+        year = request.args.get(name, type=int)
+        if year and STUDY_YEAR_MIN <= year <= datetime.utcnow().year + 10:
+            filters[name] = year
+    return filters
+
+def cohort_conditions(filters):
+    """SQL conditions for cohort filters; each is a range on an indexed date column"""
+    conditions = []
+    if 'graduating' in filters:
+        conditions.append(User.study_end >= date(filters['graduating'], 1, 1))
+        conditions.append(User.study_end < date(filters['graduating'] + 1, 1, 1))
+    # Studied at some point in [studied_from, studied_to]: the study period overlaps those years
+    if 'studied_from' in filters:
+        conditions.append(db.or_(User.study_end >= date(filters['studied_from'], 1, 1),
+                                 db.and_(User.study_end.is_(None), User.study_start.isnot(None))))
+    if 'studied_to' in filters:
+        conditions.append(User.study_start < date(filters['studied_to'] + 1, 1, 1))
+    return conditions
+
+def backfill_study_periods(batch_size=1000):
+    """Parse legacy start/end strings into the typed columns; returns (updated, [(id, field, value)])"""
+    updated, failures, last_id = 0, [], 0
+    while True:
+        batch = User.query.filter(User.user_type == 'member', User.id > last_id, User.start_date.isnot(None),
+                                  User.study_start.is_(None)).order_by(User.id).limit(batch_size).all()
+        if not batch:
+            break
+        for user in batch:
+            last_id = user.id
+            parsed = {}
+            for field, column in (('start_date', 'study_start'), ('end_date', 'study_end')):
+                value = getattr(user, field)
+                if not (value or '').strip():
+                    continue
+                try:
+                    parsed[column] = parse_study_month(value)
+                except ValueError:
+                    failures.append((user.id, field, value))
+            if 'study_start' in parsed:
+                for column, value in parsed.items():
+                    setattr(user, column, value)
+                updated += 1
+        db.session.commit()
+    return updated, failures
+
+# Similar members
+SIMILAR_WEIGHTS = {
+    'university': 3.0,
+    'current_company': 3.0,
+    'major': 2.0,
+    'university_country': 1.0,
+    'year': 0.5  # per overlapping study year
+}
+SIMILAR_TOP_K = 6
+SIMILAR_MAX_POSTING = 2000  # attribute values shared by more members than this are too common to rank on
+
+def _study_years(user):
+    """Return the calendar years a member studied"""
+    if user.study_start is None:
+        return []
+    if user.study_end is not None:
+        end = user.study_end.year
+    else:
+        end = datetime.utcnow().year if user.is_current_student else user.study_start.year
+    start = user.study_start.year
+    return list(range(start, min(end, start + 10) + 1))
+
+def member_attributes(user):
+    """Return the (attribute, value) pairs used to find similar members"""
+    if not user.is_active or user.is_admin or user.user_type != 'member':
+        return set()
+    pairs = set()
+    for attribute in ('university', 'major', 'university_country', 'current_company'):
+        value = (getattr(user, attribute) or '').strip().lower()
+        if value:
+            pairs.add((attribute, value[:100]))
+    for year in _study_years(user):
+        pairs.add(('year', str(year)))
+    return pairs
+
+def _rank_similar(user_id, pairs, postings):
+    """Score candidates sharing attributes with a member and return the top-K SimilarMember rows"""
+    scores = Counter()
+    for pair in pairs:
+        posting = postings(pair)
+        if posting is None:
+            continue
+        for other_id in posting:
+            if other_id != user_id:
+                scores[other_id] += SIMILAR_WEIGHTS[pair[0]]
+    return [
+        SimilarMember(user_id=user_id, rank=rank, similar_user_id=other_id, score=score)
+        for rank, (other_id, score) in enumerate(sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:SIMILAR_TOP_K])
+    ]
+
+def _query_posting(pair):
+    ids = [row.user_id for row in MemberAttribute.query.with_entities(MemberAttribute.user_id).filter_by(
+        attribute=pair[0], value=pair[1]
+    ).limit(SIMILAR_MAX_POSTING + 1)]
+    return ids if len(ids) <= SIMILAR_MAX_POSTING else None
+
+def update_member_similarity(user):
+    """Re-index one member and recompute their similar list after a profile change"""
+    current = {(row.attribute, row.value) for row in MemberAttribute.query.filter_by(user_id=user.id)}
+    pairs = member_attributes(user)
+    if pairs == current:
+        return
+    
+    MemberAttribute.query.filter_by(user_id=user.id).delete()
+    SimilarMember.query.filter_by(user_id=user.id).delete()
+    db.session.add_all(MemberAttribute(user_id=user.id, attribute=attribute, value=value) for attribute, value in pairs)
+    db.session.flush()
+    db.session.add_all(_rank_similar(user.id, pairs, _query_posting))
+
+def rebuild_similar():
+    """Rebuild the attribute index and every member's similar list"""
+    MemberAttribute.query.delete()
+    SimilarMember.query.delete()
+    
+    attributes = {}
+    postings = defaultdict(list)
+    for user in User.query.filter_by(is_active=True, is_admin=False, user_type='member').yield_per(1000):
+        pairs = member_attributes(user)
+        attributes[user.id] = pairs
+        for pair in pairs:
+            postings[pair].append(user.id)
+    
+    for user_id, pairs in attributes.items():
+        db.session.add_all(MemberAttribute(user_id=user_id, attribute=attribute, value=value) for attribute, value in pairs)
+    db.session.flush()
+    
+    def lookup(pair):
+        return postings[pair] if len(postings[pair]) <= SIMILAR_MAX_POSTING else None
+    
+    for user_id, pairs in attributes.items():
+        db.session.add_all(_rank_similar(user_id, pairs, lookup))
+    db.session.commit()
+    return len(attributes)
+
+def get_similar_members(user_id):
+    """Read a member's precomputed similar list (single indexed lookup)"""
+    rows = SimilarMember.query.filter_by(user_id=user_id).order_by(SimilarMember.rank).all()
+    return [row.similar_user for row in rows if row.similar_user.is_active and not row.similar_user.is_admin]
+
+# Anonymous full-page cache
+# Each worker keeps its own LRU. A purge also bumps a shared generation row, and every worker clears its
+# copy when it sees the generation move, checking at most once per PAGE_CACHE_SYNC_INTERVAL.
+PAGE_CACHE_ENDPOINTS = {'index', 'members', 'companies', 'contact', 'register_type_selection', 'register'}
+PAGE_CACHE_GENERATION = 'page_cache_generation'  # SiteStat row
+
+class PageCache:
+    """Per-worker LRU of rendered pages for logged-out visitors"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (path, query, locale) -> (body, status, headers, stored_at)
+        self.revalidating = set()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.synced_at = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, body, status, headers):
+        with self.lock:
+            self.entries[key] = (body, status, headers, time.monotonic())
+            self.entries.move_to_end(key)
+            self.revalidating.discard(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def start_revalidation(self, key):
+        """Return True if the caller should refresh this key (only one refresh at a time)"""
+        with self.lock:
+            if key in self.revalidating:
+                return False
+            self.revalidating.add(key)
+            return True
+
+    def purge(self, paths):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] in paths]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.revalidating.clear()
+
+    def sync(self, generation):
+        """Drop every entry if some worker purged since this one last looked"""
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            self.synced_at = time.monotonic()
+
+page_cache = PageCache(app.config['PAGE_CACHE_MAX_ENTRIES'])
+
+def purge_profile_pages(user_type=None):
+    """Purge cached directory pages after a member or company changes, in this worker and (on commit) all others"""
+    paths = {'/'}
+    if user_type in (None, 'member'):
+        paths.add(url_for('members'))
+    if user_type in (None, 'company'):
+        paths.add(url_for('companies'))
+    page_cache.purge(paths)
+    db.session.execute(dialect_insert(SiteStat.__table__).values(
+        name=PAGE_CACHE_GENERATION, value=1, updated_at=datetime.utcnow()
+    ).on_conflict_do_update(index_elements=['name'], set_={'value': SiteStat.__table__.c.value + 1}))
+
+def sync_page_cache():
+    """Pick up purges made by other workers (at most one primary-key read per PAGE_CACHE_SYNC_INTERVAL)"""
+    if time.monotonic() - page_cache.synced_at < app.config['PAGE_CACHE_SYNC_INTERVAL']:
+        return
+    try:
+        generation = db.session.query(SiteStat.value).filter_by(name=PAGE_CACHE_GENERATION).scalar() or 0
+    except Exception as e:
+        db.session.rollback()
+        print(f"Page cache sync failed: {e}")
+        return
+    page_cache.sync(generation)
+
+def _page_cache_key():
+    return (request.path, request.query_string.decode('utf-8', 'replace'), get_locale())
+
+def _is_page_cacheable():
+    if not app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET':
+        return False
+    if request.endpoint not in PAGE_CACHE_ENDPOINTS:
+        return False
+    # Logged-in users, remembered users and pending flashes all travel in cookies
+    return not (app.config['SESSION_COOKIE_NAME'] in request.cookies or 'remember_token' in request.cookies)
+
+def _revalidate_page(key):
+    path, query_string, _ = key
+    try:
+        # A fresh app context, so the flag (and the database session) never leak into anyone else's g
+        with app.app_context(), app.test_request_context(path, query_string=query_string):
+            g.page_cache_revalidate = True
+            app.full_dispatch_request()
+    except Exception as e:
+        print(f"Page cache revalidation failed for {path}: {e}")
+    finally:
+        with page_cache.lock:
+            page_cache.revalidating.discard(key)
+
+@app.before_request
+def serve_cached_page():
+    if g.get('page_cache_revalidate') or not _is_page_cacheable():
+        return None
+    sync_page_cache()
+    key = _page_cache_key()
+    entry = page_cache.get(key)
+    if entry is None:
+        return None
+    
+    body, status, headers, stored_at = entry
+    age = time.monotonic() - stored_at
+    if age > app.config['PAGE_CACHE_TTL'] + app.config['PAGE_CACHE_STALE_TTL']:
+        return None
+    
+    state = 'HIT'
+    if age > app.config['PAGE_CACHE_TTL']:
+        state = 'STALE'
+        if page_cache.start_revalidation(key):
+            threading.Thread(target=_revalidate_page, args=(key,), daemon=True).start()
+    
+    response = make_response(body, status, headers)
+    response.headers['X-Page-Cache'] = state
+    return response
+
+@app.after_request
+def store_cached_page(response):
+    if 'X-Page-Cache' in response.headers or not _is_page_cacheable():
+        return response
+    # Pages that flashed a message or touched the session are per-visitor
+    if response.status_code != 200 or response.direct_passthrough or session.modified:
+        return response
+    
+    response.headers['Vary'] = 'Cookie'
+    headers = [(name, value) for name, value in response.headers if name.lower() != 'set-cookie']
+    page_cache.set(_page_cache_key(), response.get_data(), response.status_code, headers)
+    response.headers['X-Page-Cache'] = 'MISS'
+    return response
+
+# Image variants
+THUMBNAIL_WIDTHS = (80, 160, 240, 480)  # widths offered in srcset; anything else serves the original
+THUMBNAIL_FORMATS = {'JPEG', 'PNG'}  # GIFs may be animated, so they are left alone
+HERO_SPRITE_TILE = 160  # pixels per avatar, twice the largest bubble size
+HERO_SPRITE_COLUMNS = 6
+
+def upload_thumbnail(filename, width):
+    """Return the upload-relative path of a copy of an image at most `width` wide, creating it on first use"""
+    relative = os.path.join('thumbs', str(width), filename)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], relative)
+    if os.path.exists(path):
+        return relative
+    try:
+        with Image.open(os.path.join(app.config['UPLOAD_FOLDER'], filename)) as image:
+            image_format = image.format
+            if image_format not in THUMBNAIL_FORMATS or image.width <= width:
+                return filename
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, width * 4))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            image.save(temporary, format=image_format, quality=82, optimize=True)
+            os.replace(temporary, path)  # other workers never see a half-written file
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return filename
+    return relative
+
+@app.template_global()
+def upload_srcset(filename):
+    """srcset listing the resized copies of an uploaded image"""
+    return ', '.join(f"{url_for('uploaded_file', filename=filename, w=width)} {width}w" for width in THUMBNAIL_WIDTHS)
+
+def build_hero_sprite(photo_filenames):
+    """Pack avatars into one JPEG; returns (sprite filename, {photo: (background-size, background-position)})"""
+    tiles = {}
+    for filename in dict.fromkeys(photo_filenames):
+        try:
+            with Image.open(os.path.join(app.config['UPLOAD_FOLDER'], filename)) as image:
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                tiles[filename] = ImageOps.fit(image, (HERO_SPRITE_TILE, HERO_SPRITE_TILE))
+        except (OSError, ValueError, Image.DecompressionBombError):
+            continue  # missing or unreadable upload: that member keeps a plain <img>
+    if not tiles:
+        return None, {}
+    
+    columns = min(HERO_SPRITE_COLUMNS, len(tiles))
+    rows = math.ceil(len(tiles) / columns)
+    sprite = Image.new('RGB', (columns * HERO_SPRITE_TILE, rows * HERO_SPRITE_TILE), 'white')
+    offsets = {}
+    for index, (filename, tile) in enumerate(tiles.items()):
+        column, row = index % columns, index // columns
+        sprite.paste(tile, (column * HERO_SPRITE_TILE, row * HERO_SPRITE_TILE))
+        # Percentages keep the tile aligned whatever size CSS gives the bubble
+        x = column * 100 // (columns - 1) if columns > 1 else 0
+        y = row * 100 // (rows - 1) if rows > 1 else 0
+        offsets[filename] = (f'{columns * 100}% {rows * 100}%', f'{x}% {y}%')
+    
+    buffer = io.BytesIO()
+    sprite.save(buffer, format='JPEG', quality=80, optimize=True, progressive=True)
+    data = buffer.getvalue()
+    sprite_filename = f'hero.{hashlib.sha256(data).hexdigest()[:12]}.jpg'
+    sprite_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'sprites')
+    os.makedirs(sprite_dir, exist_ok=True)
+    path = os.path.join(sprite_dir, sprite_filename)
+    if not os.path.exists(path):
+        with open(f'{path}.{os.getpid()}.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+    
+    # Cached pages may still point at the previous sprite for a while, so only old ones go
+    cutoff = time.time() - 2 * app.config['FEATURED_REFRESH_INTERVAL']
+    for name in os.listdir(sprite_dir):
+        old_path = os.path.join(sprite_dir, name)
+        if name != sprite_filename and os.path.getmtime(old_path) < cutoff:
+            os.remove(old_path)
+    return sprite_filename, offsets
+
+# Featured rotation
+FEATURED_SLOTS = {
+    # slot: (user_type, size)
+    'hero': ('member', 30),
+    'member': ('member', 8),
+    'company': ('company', 10)
+}
+FEATURED_REPEAT_WEIGHT = 0.2  # members featured last round are less likely to be picked again
+FEATURED_NEW_MEMBER_WEIGHT = 3.0  # recent joiners get extra hero exposure
+FEATURED_NEW_MEMBER_DAYS = 90
+
+_featured_cache = {'loaded_at': 0, 'data': None}
+
+def _weighted_sample(candidates, k):
+    """Pick k candidates without replacement, weighted (Efraimidis-Spirakis)"""
+    keyed = ((random.random() ** (1.0 / weight), row) for row, weight in candidates)
+    return [row for _, row in heapq.nlargest(k, keyed, key=lambda item: item[0])]
+
+def acquire_site_lock(name, expires_after):
+    """Claim a lock row in site_stat shared by every worker; False while another holder's claim is fresh"""
+    now = datetime.utcnow()
+    db.session.execute(
+        dialect_insert(SiteStat.__table__).values(name=name, value=0, updated_at=now).on_conflict_do_nothing()
+    )
+    claimed = db.session.execute(
+        db.update(SiteStat)
+        .where(SiteStat.name == name,
+               db.or_(SiteStat.value == 0, SiteStat.updated_at < now - timedelta(seconds=expires_after)))
+        .values(value=1, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+def release_site_lock(name):
+    SiteStat.query.filter_by(name=name).update({'value': 0})
+    db.session.commit()
+
+FEATURED_REFRESH_LOCK = 'featured_refresh_lock'
+
+def refresh_featured():
+    """Rebuild the featured rotation snapshot and homepage stats; None if another refresh is running"""
+    if not acquire_site_lock(FEATURED_REFRESH_LOCK, app.config['FEATURED_REFRESH_TIMEOUT']):
+        return None
+    try:
+        count = _rebuild_featured()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        release_site_lock(FEATURED_REFRESH_LOCK)
+    _featured_cache['data'] = None
+    page_cache.purge({'/'})
+    return count
+
+def _rebuild_featured():
+    previous = {(slot.slot, slot.user_id) for slot in FeaturedSlot.query.all()}
+    new_member_cutoff = datetime.utcnow() - timedelta(days=FEATURED_NEW_MEMBER_DAYS)
+    columns = (User.id, User.full_name, User.company_name, User.photo_filename, User.current_position,
+               User.current_company, User.major, User.university, User.university_country, User.date_joined)
+    
+    slots = []
+    for slot, (user_type, size) in FEATURED_SLOTS.items():
+        rows = db.session.query(*columns).filter(
+            User.is_active == True,
+            User.is_admin == False,
+            User.user_type == user_type,
+            User.photo_filename.isnot(None),
+            User.photo_filename != ''
+        ).yield_per(1000)
+        
+        def weighted(rows=rows, slot=slot):
+            for row in rows:
+                weight = FEATURED_REPEAT_WEIGHT if (slot, row.id) in previous else 1.0
+                if slot == 'hero' and row.date_joined and row.date_joined >= new_member_cutoff:
+                    weight *= FEATURED_NEW_MEMBER_WEIGHT
+                yield row, weight
+        
+        for position, row in enumerate(_weighted_sample(weighted(), size)):
+            slots.append(FeaturedSlot(
+                slot=slot,
+                position=position,
+                user_id=row.id,
+                full_name=row.full_name,
+                company_name=row.company_name,
+                photo_filename=row.photo_filename,
+                current_position=row.current_position,
+                current_company=row.current_company,
+                major=row.major,
+                university=row.university,
+                university_country=row.university_country
+            ))
+    
+    # One sprite request for the hero bubbles instead of one per avatar
+    hero_slots = [slot for slot in slots if slot.slot == 'hero']
+    try:
+        sprite, offsets = build_hero_sprite([slot.photo_filename for slot in hero_slots])
+    except Exception as e:
+        print(f"Hero sprite build failed: {e}")
+        sprite, offsets = None, {}
+    for slot in hero_slots:
+        if slot.photo_filename in offsets:
+            slot.sprite = sprite
+            slot.sprite_size, slot.sprite_position = offsets[slot.photo_filename]
+    
+    # Statistics for the stats panel
+    total_members = User.query.filter_by(is_active=True, is_admin=False).count()
+    members = db.session.query(User).filter(User.is_active == True, User.is_admin == False)
+    unique_countries = members.filter(User.university_country_id.isnot(None)).with_entities(
+        User.university_country_id
+    ).distinct().count()
+    # Values not (yet) mapped to a country still count, once per spelling
+    unique_countries += members.filter(
+        User.university_country_id.is_(None),
+        User.university_country.isnot(None),
+        User.university_country != ''
+    ).with_entities(User.university_country).distinct().count()
+    verified_members = User.query.filter_by(is_active=True, is_verified=True, is_admin=False).count()
+    stats = {
+        'total_members': total_members,
+        'unique_countries': unique_countries,
+        'verified_members': verified_members
+    }
+    
+    FeaturedSlot.query.delete()
+    db.session.add_all(slots)
+    for name, value in stats.items():
+        db.session.merge(SiteStat(name=name, value=value, updated_at=datetime.utcnow()))
+    db.session.commit()
+    return len(slots)
+
+def retire_hero_sprite():
+    """Stop serving the hero sprite, e.g. when a face in it must disappear; bubbles use plain images until the next refresh"""
+    sprites = {sprite for sprite, in db.session.query(FeaturedSlot.sprite).filter(FeaturedSlot.sprite.isnot(None)).distinct()}
+    FeaturedSlot.query.filter(FeaturedSlot.sprite.isnot(None)).update(
+        {'sprite': None, 'sprite_size': None, 'sprite_position': None}, synchronize_session=False
+    )
+    for sprite in sprites:
+        try:
+            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], 'sprites', secure_filename(sprite)))
+        except OSError:
+            pass
+
+def remove_from_featured(user_id):
+    """Drop a user from the rotation (e.g. after deactivation)"""
+    if FeaturedSlot.query.filter_by(user_id=user_id, slot='hero').filter(FeaturedSlot.sprite.isnot(None)).count():
+        retire_hero_sprite()
+    FeaturedSlot.query.filter_by(user_id=user_id).delete()
+    _featured_cache['data'] = None
+    page_cache.purge({'/'})
+
+def get_featured():
+    """Return the featured snapshot, served from memory for FEATURED_CACHE_TTL seconds
+
+    Read-only: the snapshot is rebuilt by 'flask refresh-featured' (cron) and seeded at startup.
+    """
+    now = time.monotonic()
+    if _featured_cache['data'] is not None and now - _featured_cache['loaded_at'] < app.config['FEATURED_CACHE_TTL']:
+        return _featured_cache['data']
+    
+    slots = FeaturedSlot.query.order_by(FeaturedSlot.slot, FeaturedSlot.position).all()
+    
+    data = {slot: [] for slot in FEATURED_SLOTS}
+    sprites_present = {}  # the sprite may have been built on another host without a shared uploads volume
+    for slot in slots:
+        entry = slot.to_dict()
+        if slot.sprite:
+            if slot.sprite not in sprites_present:
+                sprites_present[slot.sprite] = os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'sprites', slot.sprite))
+            if not sprites_present[slot.sprite]:
+                entry['sprite'] = None
+        data[slot.slot].append(entry)
+    
+    stats = {stat.name: stat.value for stat in SiteStat.query.all()}
+    total_members = stats.get('total_members', 0)
+    data['stats'] = {
+        'total_members': total_members,
+        'unique_countries': stats.get('unique_countries', 0),
+        'success_rate': round((stats.get('verified_members', 0) / total_members * 100) if total_members > 0 else 0)
+    }
+    
+    _featured_cache['data'] = data
+    _featured_cache['loaded_at'] = now
+    return data
+
+# Profile change events
+# profile_changed is sent inside the edit's transaction with changes = {field: (old, new)};
+# subscribers only act when a field they depend on actually changed. Registration, (de)activation and
+# promotion send it too, as a change of is_active / is_admin (a new account goes from inactive to active)
+profile_signals = Namespace()
+profile_changed = profile_signals.signal('profile-changed')
+
+SOCIAL_FIELDS = ['linkedin_url', 'instagram_url', 'x_twitter_url', 'telegram_url', 'github_url', 'personal_website']
+PROFILE_EDIT_FIELDS = {
+    'member': ['full_name', 'bio', 'phone', 'start_date', 'end_date'] + SOCIAL_FIELDS,
+    'company': ['company_name', 'company_country', 'industry', 'bio', 'phone'] + SOCIAL_FIELDS
+}
+SIMILARITY_FIELDS = {'university', 'major', 'university_country', 'current_company', 'study_start', 'study_end'}
+# Fields rendered on directory cards and the homepage
+LISTING_FIELDS = {'full_name', 'company_name', 'photo_filename', 'university', 'major', 'university_country',
+                  'current_position', 'current_company', 'company_country', 'industry'}
+FEATURED_FIELDS = {'full_name', 'company_name', 'photo_filename', 'current_position', 'current_company',
+                   'major', 'university', 'university_country'}
+# Fields that decide whether a user appears in the directory, facets, similar lists and homepage at all
+VISIBILITY_FIELDS = {'is_active', 'is_admin'}
+
+def profile_changes(user, form, uploads=None):
+    """Return {field: new value} for submitted fields that differ from the stored profile"""
+    changes = {}
+    for field in PROFILE_EDIT_FIELDS.get(user.user_type, []):
+        value = form.get(field)
+        if value is not None and (value or None) != (getattr(user, field) or None):
+            changes[field] = value
+    changes.update(uploads or {})
+    return changes
+
+def previous_profile(user, changes):
+    """Snapshot of a user as it was before `changes` were applied"""
+    state = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+    state.update({field: old for field, (old, _) in changes.items()})
+    return SimpleNamespace(**state)
+
+@profile_changed.connect
+def _update_facets_on_change(sender, user, changes):
+    facet_fields = set(FACETS.get(user.user_type, [])) | {key for key, _ in FACET_KEYS.values()} | VISIBILITY_FIELDS
+    if set(changes) & facet_fields:
+        update_facets(facet_values(previous_profile(user, changes)), facet_values(user))
+
+@profile_changed.connect
+def _update_similarity_on_change(sender, user, changes):
+    if set(changes) & (SIMILARITY_FIELDS | VISIBILITY_FIELDS):
+        update_member_similarity(user)
+
+@profile_changed.connect
+def _update_featured_on_change(sender, user, changes):
+    if set(changes) & VISIBILITY_FIELDS and (not user.is_active or user.is_admin):
+        remove_from_featured(user.id)
+        return
+    display = {field: new for field, (_, new) in changes.items() if field in FEATURED_FIELDS}
+    if 'photo_filename' in display and FeaturedSlot.query.filter_by(user_id=user.id, slot='hero').filter(
+            FeaturedSlot.sprite.isnot(None)).count():
+        retire_hero_sprite()  # the old face is baked into the sprite
+    if display and FeaturedSlot.query.filter_by(user_id=user.id).update(display):
+        _featured_cache['data'] = None
+
+@profile_changed.connect
+def _purge_pages_on_change(sender, user, changes):
+    if set(changes) & (LISTING_FIELDS | VISIBILITY_FIELDS):
+        purge_profile_pages(user.user_type)
+
 # Routes
 @app.route('/')
 def index():
     try:
-        # Get featured members for the carousel (limit to 8 members)
-        featured_members = User.query.filter_by(
-            is_active=True, 
-            is_admin=False, 
-            user_type='member'
-        ).filter(User.photo_filename.isnot(None)).limit(8).all()
-        
-        # Get hero members for the hero section (limit to 30 members)
-        hero_members = User.query.filter_by(
-            is_active=True, 
-            is_admin=False, 
-            user_type='member'
-        ).order_by(User.date_joined.desc()).limit(30).all()
-        
-        # Get featured companies for the trusted by section (limit to 10 companies)
-        featured_companies = User.query.filter_by(
-            is_active=True, 
-            is_admin=False, 
-            user_type='company'
-        ).filter(User.photo_filename.isnot(None)).limit(10).all()
-        
-        # Get statistics for the stats panel
-        total_members = User.query.filter_by(is_active=True, is_admin=False).count()
-        unique_countries = db.session.query(User.university_country).filter(
-            User.is_active == True, 
-            User.is_admin == False,
-            User.university_country.isnot(None),
-            User.university_country != ''
-        ).distinct().count()
-        
-        # Calculate success rate (percentage of verified members)
-        verified_members = User.query.filter_by(is_active=True, is_verified=True, is_admin=False).count()
-        success_rate = round((verified_members / total_members * 100) if total_members > 0 else 0)
-        
-        stats = {
-            'total_members': total_members,
-            'unique_countries': unique_countries,
-            'success_rate': success_rate
-        }
+        # Featured members, hero members, companies and stats come from the rotation snapshot
+        featured = get_featured()
         
-        return render_template('index.html', featured_members=featured_members, hero_members=hero_members, featured_companies=featured_companies, stats=stats)
+        return render_template('index.html', featured_members=featured['member'], hero_members=featured['hero'], featured_companies=featured['company'], stats=featured['stats'])
         
     except Exception as e:
-        if "no such table: user" in str(e):
-            print("⚠️  Table missing - reinitializing database...")
-            with app.app_context():
-                try:
-                    init_db()
-                    create_default_admin()
-                    flash('Database was initialized. Please refresh the page.', 'info')
-                    return redirect(url_for('index'))
-                except Exception as init_error:
-                    print(f"❌ Failed to reinitialize database: {init_error}")
-                    flash('Database initialization failed. Please contact support.', 'error')
-                    return render_template('index.html', featured_members=[], hero_members=[], featured_companies=[], stats={'total_members': 0, 'unique_countries': 0, 'success_rate': 0})
+        if "no such table" in str(e):
+            # Schema changes belong to startup and the CLI, never to a page view; show the empty homepage
+            print(f"⚠️  Homepage data unavailable until the database is initialized at startup: {e}")
+            db.session.rollback()
+            return render_template('index.html', featured_members=[], hero_members=[], featured_companies=[], stats={'total_members': 0, 'unique_countries': 0, 'success_rate': 0})
         else:
             raise  # Re-raise other errors
 
+# On-demand request profiler
+profile_dir = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+_profile_counter = {'requests': 0}
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and exports it in speedscope's format"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []  # (stack of (name, file, line) from root to leaf, weight in ms)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples.append((tuple(reversed(stack)), (now - last) * 1000))
+            last = now
+
+    def to_speedscope(self, name):
+        frames, frame_index, samples, weights = [], {}, [], []
+        for stack, weight in self.samples:
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(round(weight, 3))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'exporter': 'uzbek-global-network',
+            'name': name,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 3),
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+PROFILE_SKIP_ENDPOINTS = {'healthz', 'readyz'}  # probes run constantly; a file write each would skew them
+
+def _should_profile():
+    if request.endpoint in PROFILE_SKIP_ENDPOINTS:
+        return False
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if rate:
+        _profile_counter['requests'] += 1
+        if _profile_counter['requests'] % rate == 0:
+            return True
+    # Explicit requests are admin-only; the flag check keeps the common path free of user lookups
+    if request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1':
+        return current_user.is_authenticated and current_user.is_admin
+    return False
+
+@app.before_request
+def start_profiler():
+    if _should_profile():
+        g.profiler = StackSampler(threading.get_ident(), app.config['PROFILE_INTERVAL'])
+        g.profiler.start()
+
+@app.after_request
+def save_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    
+    name = f"{request.method} {request.full_path.rstrip('?')}"
+    slug = secure_filename(request.path.strip('/').replace('/', '-')) or 'index'
+    filename = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{request.method.lower()}-{slug}-{int(profiler.duration_ms)}ms.speedscope.json"
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(os.path.join(profile_dir, filename), 'w', encoding='utf-8') as f:
+        json.dump(profiler.to_speedscope(name), f)
+    
+    stored = sorted(os.listdir(profile_dir))
+    for old in stored[:max(0, len(stored) - app.config['PROFILE_MAX_FILES'])]:
+        os.remove(os.path.join(profile_dir, old))
+    
+    # Sampled requests come from anyone; only admins can fetch profiles, so only they learn the id
+    if current_user.is_authenticated and current_user.is_admin:
+        response.headers['X-Profile-Id'] = filename
+    return response
+
+# Health checks (exempt from rate limits; never cached or database-heavy)
+_readiness = {'checked_at': 0, 'result': None}
+
+@app.route('/healthz')
+@limiter.exempt
+def healthz():
+    """Liveness: the process is up and serving requests, no I/O"""
+    return jsonify(status='ok')
+
+@app.route('/readyz')
+@limiter.exempt
+def readyz():
+    """Readiness: database answers SELECT 1 and the upload folder is writable (cached briefly)"""
+    now = time.monotonic()
+    if _readiness['result'] is None or now - _readiness['checked_at'] >= app.config['READINESS_CACHE_TTL']:
+        started = time.perf_counter()
+        try:
+            db.session.execute(db.text('SELECT 1'))
+            database = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+        except Exception as e:
+            db.session.rollback()
+            database = {'ok': False, 'error': str(e)}
+        uploads = {'ok': os.access(app.config['UPLOAD_FOLDER'], os.W_OK)}
+        _readiness['result'] = {
+            'status': 'ok' if database['ok'] and uploads['ok'] else 'unavailable',
+            'checks': {'database': database, 'uploads': uploads}
+        }
+        _readiness['checked_at'] = now
+    
+    result = _readiness['result']
+    return jsonify(result), 200 if result['status'] == 'ok' else 503
+
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -374,6 +1719,14 @@ def register(user_type):
             flash('Passwords do not match!', 'error')
             return render_template('register.html', user_type=user_type)
         
+        if user_type == 'member':
+            try:
+                study = study_period(request.form.get('start_date'), request.form.get('end_date'),
+                                     'is_current_student' in request.form)
+            except ValueError as e:
+                flash(f'Invalid study period: {e}.', 'error')
+                return render_template('register.html', user_type=user_type)
+        
         # Handle photo upload
         photo_filename = None
         if 'photo' in request.files:
@@ -394,16 +1747,19 @@ def register(user_type):
         user = User(
             email=email,
             full_name=full_name,
-            user_type=user_type
+            user_type=user_type,
+            language=get_locale()
         )
+        if user_type == 'member':
+            user.university_id = match_university(email)
         
         # Set fields based on user type
         if user_type == 'member':
             user.university = request.form['university']
-            user.university_country = request.form['university_country']
+            user.university_country_id, user.university_country = match_country(request.form['university_country'])
             user.major = request.form['major']
-            user.start_date = request.form['start_date']
-            user.end_date = request.form['end_date']
+            for field, value in study.items():
+                setattr(user, field, value)
             user.is_current_student = 'is_current_student' in request.form
             user.current_company = request.form.get('current_company', '')
             user.current_position = request.form.get('current_position', '')
@@ -412,7 +1768,7 @@ def register(user_type):
             user.photo_filename = photo_filename
         elif user_type == 'company':
             user.company_name = request.form['company_name']
-            user.company_country = request.form['company_country']
+            user.company_country_id, user.company_country = match_country(request.form['company_country'])
             user.industry = request.form['industry']
             
             # Handle company logo upload
@@ -427,6 +1783,8 @@ def register(user_type):
         user.set_password(password)
         
         db.session.add(user)
+        db.session.flush()  # apply column defaults (is_active, is_admin) before counting
+        profile_changed.send(app, user=user, changes={'is_active': (False, user.is_active)})
         db.session.commit()
         
         flash('Registration successful! Please log in.', 'success')
@@ -459,6 +1817,7 @@ def forgot_password():
         user = User.query.filter_by(email=email).first()
         
         if user:
+            audit('password.reset_requested', user)
             if send_password_reset_email(user):
                 flash('Password reset email sent! Check your inbox.', 'success')
             else:
@@ -488,6 +1847,7 @@ def reset_password(token):
         user.reset_token = None
         user.reset_token_expires = None
         db.session.commit()
+        audit('password.reset', user)
         
         flash('Password updated successfully! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -522,13 +1882,19 @@ def dashboard():
 
 @app.route('/members')
 def members():
-    users = User.query.filter_by(is_active=True).filter_by(is_admin=False).filter_by(user_type='member').all()
-    return render_template('members.html', users=users)
+    filters = get_facet_filters('member')
+    cohort = get_cohort_filters()
+    users = User.query.filter_by(is_active=True).filter_by(is_admin=False).filter_by(user_type='member').filter(
+        *facet_conditions(filters), *cohort_conditions(cohort)
+    ).all()
+    return render_template('members.html', users=users, facets=get_facet_sidebar('member'), filters=dict(filters, **cohort),
+                           filter_labels=facet_filter_labels(filters), cohort=cohort)
 
 @app.route('/companies')
 def companies():
-    companies = User.query.filter_by(is_active=True).filter_by(is_admin=False).filter_by(user_type='company').all()
-    return render_template('companies.html', companies=companies)
+    filters = get_facet_filters('company')
+    companies = User.query.filter_by(is_active=True).filter_by(is_admin=False).filter_by(user_type='company').filter(*facet_conditions(filters)).all()
+    return render_template('companies.html', companies=companies, facets=get_facet_sidebar('company'), filters=filters)
 
 @app.route('/contact')
 def contact():
@@ -538,91 +1904,674 @@ def contact():
 def set_language(language=None):
     if language in app.config['LANGUAGES']:
         session['language'] = language
+        if current_user.is_authenticated and current_user.language != language:
+            current_user.language = language
+            db.session.commit()
     return redirect(request.referrer or url_for('index'))
 
 @app.route('/member/<int:user_id>')
 def member_details(user_id):
     user = User.query.get_or_404(user_id)
-    return render_template('member_details.html', user=user)
+    record_profile_view(user)
+    views, views_this_week = get_profile_views(user.id)
+    return render_template('member_details.html', user=user, similar_members=get_similar_members(user.id),
+                           views=views, views_this_week=views_this_week)
 
 @app.route('/company/<int:company_id>')
 def company_details(company_id):
     company = User.query.get_or_404(company_id)
     if company.user_type != 'company':
         abort(404)
-    return render_template('company_details.html', company=company)
+    record_profile_view(company)
+    views, views_this_week = get_profile_views(company.id)
+    return render_template('company_details.html', company=company, views=views, views_this_week=views_this_week)
+
+UPLOAD_IMAGE_MAX_AGE = 365 * 24 * 3600  # upload names are random UUIDs, so images never change
+UPLOAD_DOCUMENT_MAX_AGE = 24 * 3600  # CVs can be hidden when their owner is deactivated
+
+@app.route('/uploads/<path:filename>')
+@limiter.exempt
+def uploaded_file(filename):
+    """Serve a photo, logo or CV after checking its owner is visible"""
+    filename = secure_filename(filename)
+    owner = User.query.filter(db.or_(User.photo_filename == filename, User.cv_filename == filename)).first()
+    if owner is None:
+        abort(404)
+    if not owner.is_active and not (current_user.is_authenticated and (current_user.is_admin or current_user.id == owner.id)):
+        abort(404)
+    
+    # Only the owner and admins see a deactivated user's files, so no shared cache may keep them
+    hidden = not owner.is_active
+    is_image = filename == owner.photo_filename
+    if is_image and request.args.get('w', type=int) in THUMBNAIL_WIDTHS:
+        return send_upload(upload_thumbnail(filename, request.args.get('w', type=int)), UPLOAD_IMAGE_MAX_AGE,
+                           immutable=True, private=hidden)
+    if is_image:
+        return send_upload(filename, UPLOAD_IMAGE_MAX_AGE, immutable=True, private=hidden)
+    return send_upload(filename, UPLOAD_DOCUMENT_MAX_AGE, private=hidden)
+
+@app.route('/sprites/<filename>')
+@limiter.exempt
+def hero_sprite(filename):
+    """Serve a generated avatar sprite (content-hashed, so cacheable forever)"""
+    filename = secure_filename(filename)
+    if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'sprites', filename)):
+        abort(404)
+    return send_upload(f'sprites/{filename}', UPLOAD_IMAGE_MAX_AGE, immutable=True)
+
+@app.before_request
+def redirect_static_uploads():
+    """Send /static/uploads/<name> through the routes above instead of Flask's unchecked static handler"""
+    # nginx rewrites the same URLs, but the dev server, the ASGI mode and a directly exposed port have no nginx
+    if request.endpoint != 'static':
+        return None
+    filename = posixpath.normpath(request.view_args.get('filename', '')).lstrip('/')
+    if not filename.startswith('uploads/'):
+        return None
+    filename = filename[len('uploads/'):]
+    if filename.startswith('sprites/'):
+        return redirect(url_for('hero_sprite', filename=filename[len('sprites/'):]), 301)
+    return redirect(url_for('uploaded_file', filename=filename), 301)
+
+def send_upload(path, max_age, immutable=False, private=False):
+    """Send a file below UPLOAD_FOLDER, through nginx when UPLOADS_ACCEL_REDIRECT is set; private ones are never stored"""
+    accel_prefix = app.config.get('UPLOADS_ACCEL_REDIRECT')
+    if accel_prefix:
+        # nginx streams the file (with Range support) from its internal location
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path
+        response.headers['Content-Type'] = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    else:
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], path, conditional=True, max_age=max_age)
+    
+    if private:
+        response.headers['Cache-Control'] = 'private, no-store'
+    else:
+        response.headers['Cache-Control'] = f"public, max-age={max_age}" + (', immutable' if immutable else '')
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
 
 @app.route('/edit-profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     if request.method == 'POST':
-        if current_user.user_type == 'member':
-            # Update member information
-            current_user.full_name = request.form.get('full_name', current_user.full_name)
-            current_user.bio = request.form.get('bio', current_user.bio)
-            current_user.phone = request.form.get('phone', current_user.phone)
-            
-            # Update social media
-            current_user.linkedin_url = request.form.get('linkedin_url', current_user.linkedin_url)
-            current_user.instagram_url = request.form.get('instagram_url', current_user.instagram_url)
-            current_user.x_twitter_url = request.form.get('x_twitter_url', current_user.x_twitter_url)
-            current_user.telegram_url = request.form.get('telegram_url', current_user.telegram_url)
-            current_user.github_url = request.form.get('github_url', current_user.github_url)
-            
-            # Update additional fields
-            current_user.personal_website = request.form.get('personal_website', current_user.personal_website)
-            
-            # Handle photo upload
-            if 'photo' in request.files:
-                file = request.files['photo']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    unique_filename = str(uuid.uuid4()) + '.' + filename.rsplit('.', 1)[1].lower()
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                    current_user.photo_filename = unique_filename
-            
-            # Handle CV upload
-            if 'cv' in request.files:
-                file = request.files['cv']
-                if file and file.filename:
-                    filename = secure_filename(file.filename)
-                    unique_filename = str(uuid.uuid4()) + '.' + filename.rsplit('.', 1)[1].lower()
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                    current_user.cv_filename = unique_filename
-        
-        elif current_user.user_type == 'company':
-            # Update company information
-            current_user.company_name = request.form.get('company_name', current_user.company_name)
-            current_user.company_country = request.form.get('company_country', current_user.company_country)
-            current_user.industry = request.form.get('industry', current_user.industry)
-            current_user.bio = request.form.get('bio', current_user.bio)
-            current_user.phone = request.form.get('phone', current_user.phone)
-            
-            # Update social media
-            current_user.linkedin_url = request.form.get('linkedin_url', current_user.linkedin_url)
-            current_user.instagram_url = request.form.get('instagram_url', current_user.instagram_url)
-            current_user.x_twitter_url = request.form.get('x_twitter_url', current_user.x_twitter_url)
-            current_user.telegram_url = request.form.get('telegram_url', current_user.telegram_url)
-            current_user.github_url = request.form.get('github_url', current_user.github_url)
-            
-            # Update additional fields
-            current_user.personal_website = request.form.get('personal_website', current_user.personal_website)
-            
-            # Handle logo upload
-            if 'logo' in request.files:
-                file = request.files['logo']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    unique_filename = str(uuid.uuid4()) + '.' + filename.rsplit('.', 1)[1].lower()
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                    current_user.photo_filename = unique_filename
+        # Uploads always count as changes; files are only written once the update wins
+        upload_fields = {'member': {'photo': 'photo_filename', 'cv': 'cv_filename'},
+                         'company': {'logo': 'photo_filename'}}.get(current_user.user_type, {})
+        pending_files = []
+        uploads = {}
+        for input_name, field in upload_fields.items():
+            file = request.files.get(input_name)
+            if not file or not file.filename or '.' not in file.filename:
+                continue
+            if input_name != 'cv' and not allowed_file(file.filename):
+                continue
+            filename = secure_filename(file.filename)
+            unique_filename = str(uuid.uuid4()) + '.' + filename.rsplit('.', 1)[1].lower()
+            pending_files.append((file, unique_filename))
+            uploads[field] = unique_filename
+        
+        changes = profile_changes(current_user, request.form, uploads)
+        if 'start_date' in changes or 'end_date' in changes:
+            try:
+                study = study_period(changes.get('start_date', current_user.start_date),
+                                     changes.get('end_date', current_user.end_date), current_user.is_current_student)
+            except ValueError as e:
+                flash(f'Invalid study period: {e}.', 'error')
+                return redirect(url_for('edit_profile'))
+            changes.update(study)
+        changes = {field: value for field, value in country_changes(changes).items() if value != getattr(current_user, field)}
+        if not changes:
+            flash('No changes to save.', 'info')
+            return redirect(url_for('dashboard'))
+        
+        # Only the changed columns are written, and only if nobody saved since this form was loaded
+        expected_version = request.form.get('version', type=int) or current_user.version
+        previous = {field: getattr(current_user, field) for field in changes}
+        updated = User.query.filter(User.id == current_user.id, User.version == expected_version).update(
+            dict(changes, version=User.version + 1, updated_at=datetime.utcnow()), synchronize_session='evaluate')
+        if not updated:
+            db.session.rollback()
+            flash('Your profile was changed in another window. Please review the latest version and save again.', 'error')
+            return redirect(url_for('edit_profile'))
         
+        for file, unique_filename in pending_files:
+            file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+        profile_changed.send(app, user=current_user, changes={field: (previous[field], value) for field, value in changes.items()})
         db.session.commit()
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('dashboard'))
     
     return render_template('edit_profile.html', user=current_user)
 
+# Sitemaps
+# /sitemap.xml indexes child sitemaps that each cover a fixed block of user ids, so an edit only dirties
+# the block it falls in. Children live on disk and are rewritten when their block's signature (public
+# profile count, newest change) moves; the signatures come from one grouped scan per SITEMAP_CHECK_INTERVAL.
+sitemap_dir = app.config.get('SITEMAP_DIR') or os.path.join(app.instance_path, 'sitemaps')
+SITEMAP_XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SITEMAP_ENDPOINTS = {'member': ('member_details', 'user_id'), 'company': ('company_details', 'company_id')}
+
+_sitemaps = {'checked_at': 0, 'chunks': None, 'base_url': None, 'lock': threading.Lock()}
+
+def _sitemap_public():
+    return db.and_(User.is_active == True, User.is_admin == False, User.user_type.in_(tuple(SITEMAP_ENDPOINTS)))
+
+def _sitemap_lastmod():
+    return db.func.coalesce(User.updated_at, User.date_joined)
+
+def _sitemap_path(chunk):
+    return os.path.join(sitemap_dir, f'sitemap-{chunk}.xml')
+
+def _w3c_datetime(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+def sitemap_signatures(size):
+    """Return {chunk: (public profiles, newest change)} for every block of `size` user ids"""
+    chunk = ((User.id - 1) // size).label('chunk')
+    rows = db.session.query(chunk, db.func.count(User.id), db.func.max(_sitemap_lastmod())).filter(
+        _sitemap_public()
+    ).group_by(chunk)
+    return {int(index): (count, _w3c_datetime(newest)) for index, count, newest in rows}
+
+def write_sitemap_chunk(chunk, size, base_url):
+    """Stream one block's public profiles from a server-side cursor into its child sitemap"""
+    rows = db.session.query(User.id, User.user_type, _sitemap_lastmod()).filter(
+        _sitemap_public(), User.id > chunk * size, User.id <= (chunk + 1) * size
+    ).order_by(User.id).yield_per(1000)
+    
+    path = _sitemap_path(chunk)
+    partial = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(partial, 'w', encoding='utf-8') as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_XMLNS}">\n')
+        for user_id, user_type, modified in rows:
+            endpoint, argument = SITEMAP_ENDPOINTS[user_type]
+            location = base_url + url_for(endpoint, **{argument: user_id})
+            f.write(f'<url><loc>{xml_escape(location)}</loc><lastmod>{_w3c_datetime(modified)}</lastmod></url>\n')
+        f.write('</urlset>\n')
+    os.replace(partial, path)
+
+def refresh_sitemaps(base_url):
+    """Rewrite the child sitemaps whose block changed; returns ({chunk: lastmod}, chunks rewritten)"""
+    size = app.config['SITEMAP_URLS_PER_FILE']
+    base_url = base_url.rstrip('/')
+    os.makedirs(sitemap_dir, exist_ok=True)
+    state_path = os.path.join(sitemap_dir, 'state.json')
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        stored = {}
+    if (stored.get('size'), stored.get('base_url')) != (size, base_url):
+        stored = {'chunks': {}}
+    
+    signatures = sitemap_signatures(size)
+    rewritten = 0
+    for chunk, signature in signatures.items():
+        if stored['chunks'].get(str(chunk)) != list(signature) or not os.path.exists(_sitemap_path(chunk)):
+            write_sitemap_chunk(chunk, size, base_url)
+            rewritten += 1
+    for chunk in set(stored['chunks']) - {str(chunk) for chunk in signatures}:
+        if os.path.exists(_sitemap_path(chunk)):
+            os.remove(_sitemap_path(chunk))
+    
+    stored = {'size': size, 'base_url': base_url, 'chunks': {str(chunk): list(signature) for chunk, signature in signatures.items()}}
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(stored, f)
+    os.replace(state_path + '.tmp', state_path)
+    return {chunk: newest for chunk, (_, newest) in sorted(signatures.items())}, rewritten
+
+def sitemap_base_url():
+    """Canonical site URL for sitemap links, or None when unconfigured"""
+    base_url = app.config['SITEMAP_BASE_URL']
+    if not base_url and (app.debug or app.testing):
+        # The Host header is attacker-controlled; only trust it for local development and tests
+        base_url = request.url_root
+    return base_url.rstrip('/') if base_url else None
+
+def current_sitemaps():
+    """Return {chunk: lastmod}, refreshing changed children at most once per SITEMAP_CHECK_INTERVAL"""
+    base_url = sitemap_base_url()
+    if base_url is None:
+        abort(404)
+    with _sitemaps['lock']:
+        stale = time.monotonic() - _sitemaps['checked_at'] >= app.config['SITEMAP_CHECK_INTERVAL']
+        if _sitemaps['chunks'] is None or stale or _sitemaps['base_url'] != base_url:
+            _sitemaps['chunks'], _ = refresh_sitemaps(base_url)
+            _sitemaps['base_url'] = base_url
+            _sitemaps['checked_at'] = time.monotonic()
+        return _sitemaps['chunks']
+
+@app.route('/sitemap.xml')
+@limiter.exempt
+def sitemap_index():
+    chunks = current_sitemaps()
+    
+    def generate():
+        yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_XMLNS}">\n'
+        for chunk, lastmod in chunks.items():
+            location = _sitemaps['base_url'] + url_for('sitemap_chunk', chunk=chunk)
+            yield f'<sitemap><loc>{xml_escape(location)}</loc><lastmod>{lastmod}</lastmod></sitemap>\n'
+        yield '</sitemapindex>\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/xml')
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['SITEMAP_CHECK_INTERVAL']
+    return response
+
+@app.route('/sitemaps/sitemap-<int:chunk>.xml')
+@limiter.exempt
+def sitemap_chunk(chunk):
+    if chunk not in current_sitemaps():
+        abort(404)
+    return send_from_directory(os.path.abspath(sitemap_dir), f'sitemap-{chunk}.xml', mimetype='application/xml',
+                               conditional=True, max_age=app.config['SITEMAP_CHECK_INTERVAL'])
+
+@app.route('/robots.txt')
+@limiter.exempt
+def robots_txt():
+    lines = ['User-agent: *', 'Allow: /']
+    base_url = sitemap_base_url()
+    if base_url:
+        lines.append(f"Sitemap: {base_url}{url_for('sitemap_index')}")
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain')
+
+# Background batch writers
+class BackgroundFlusher:
+    """Base for in-process buffers that a daemon thread flushes every few seconds"""
+
+    interval_setting = None  # config key holding the flush interval in seconds
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(app.config[self.interval_setting])
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        raise NotImplementedError
+
+# Audit log
+class AuditBuffer(BackgroundFlusher):
+    """In-process queue of audit events, written in batches by a background thread"""
+
+    interval_setting = 'AUDIT_FLUSH_INTERVAL'
+
+    def __init__(self):
+        super().__init__()
+        self.events = deque()
+
+    def add(self, event):
+        self.events.append(event)
+        self._ensure_worker()
+        if len(self.events) >= app.config['AUDIT_BATCH_SIZE']:
+            self.wakeup.set()
+
+    def flush(self):
+        """Write all buffered events in one multi-row INSERT; returns the number written"""
+        with self.lock:
+            batch = []
+            while self.events:
+                batch.append(self.events.popleft())
+            if not batch:
+                return 0
+            try:
+                with app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(AuditLog.__table__.insert(), batch)
+            except Exception as e:
+                print(f"Audit log flush failed, keeping {len(batch)} events: {e}")
+                self.events.extendleft(reversed(batch))
+                return 0
+            return len(batch)
+
+audit_buffer = AuditBuffer()
+atexit.register(audit_buffer.flush)
+
+def audit(action, target_user=None, **details):
+    """Record an audit event without adding a synchronous write to the request"""
+    actor_id = current_user.id if current_user.is_authenticated else None
+    audit_buffer.add({
+        'created_at': datetime.utcnow(),
+        'action': action,
+        'actor_id': actor_id,
+        'target_user_id': target_user.id if target_user is not None else None,
+        'ip_address': get_remote_address(),
+        'details': json.dumps(details) if details else None
+    })
+
+def prune_audit_log(days, batch_size=10000):
+    """Delete audit events older than `days`, oldest first in id-range batches"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = [row.id for row in AuditLog.query.with_entities(AuditLog.id).filter(
+            AuditLog.created_at < cutoff
+        ).order_by(AuditLog.id).limit(batch_size)]
+        if not ids:
+            return deleted
+        AuditLog.query.filter(AuditLog.id >= ids[0], AuditLog.id <= ids[-1], AuditLog.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+# Profile view counters
+class ViewCounter(BackgroundFlusher):
+    """Per-worker profile view increments, flushed as one batched upsert into profile_view_daily"""
+
+    interval_setting = 'VIEW_FLUSH_INTERVAL'
+
+    def __init__(self):
+        super().__init__()
+        self.counts = Counter()  # (user_id, day) -> views not yet written
+        self.inflight = Counter()  # the batch being written; still counted until its transaction commits
+        self.flush_lock = threading.Lock()  # one flush at a time; readers never take it
+
+    def add(self, user_id):
+        with self.lock:
+            self.counts[(user_id, datetime.utcnow().date())] += 1
+        self._ensure_worker()
+
+    def pending(self, user_id):
+        """Unwritten views for a user; a read racing a commit may count a batch twice, never zero times"""
+        with self.lock:
+            return sum(views for counts in (self.counts, self.inflight)
+                       for (pending_id, _), views in counts.items() if pending_id == user_id)
+
+    def flush(self):
+        """Write pending counts; each increment is written exactly once or kept for the next flush"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.counts = self.counts, Counter()
+                self.inflight = batch
+            if not batch:
+                return 0
+            rows = [{'user_id': user_id, 'day': day, 'views': views} for (user_id, day), views in batch.items()]
+            try:
+                with app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(upsert_view_counts_statement(), rows)
+            except Exception as e:
+                print(f"Profile view flush failed, keeping {len(rows)} counters: {e}")
+                with self.lock:
+                    self.counts.update(batch)
+                    self.inflight = Counter()
+                return 0
+            with self.lock:
+                self.inflight = Counter()
+            return len(rows)
+
+def upsert_view_counts_statement():
+    """INSERT ... ON CONFLICT that adds to an existing day's count (PostgreSQL and SQLite)"""
+    statement = dialect_insert(ProfileViewDaily.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['user_id', 'day'],
+        set_={'views': ProfileViewDaily.__table__.c.views + statement.excluded.views}
+    )
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
+
+def record_profile_view(user):
+    """Count a profile view in memory; the request itself never writes"""
+    if current_user.is_authenticated and current_user.id == user.id:
+        return
+    view_counter.add(user.id)
+
+def get_profile_views(user_id):
+    """Return (total views, views in the last 7 days), including this worker's unflushed views"""
+    week_start = datetime.utcnow().date() - timedelta(days=6)
+    total, week = db.session.query(
+        db.func.coalesce(db.func.sum(ProfileViewDaily.views), 0),
+        db.func.coalesce(db.func.sum(db.case((ProfileViewDaily.day >= week_start, ProfileViewDaily.views), else_=0)), 0)
+    ).filter(ProfileViewDaily.user_id == user_id).one()
+    # Read after the query: a batch committed meanwhile is still in `inflight` rather than missing from both
+    pending = view_counter.pending(user_id)
+    return total + pending, week + pending
+
+# Admin listing helpers
+_count_cache = {}  # filter key -> (value, is_exact, stored_at)
+
+# sort name -> (indexed SQL expression, value of that expression for a loaded user)
+# The cursor value is read back from the selected sort expression, so it always matches the ORDER BY
+ADMIN_USER_SORTS = {
+    'id': User.id,
+    'email': db.func.lower(User.email),
+    'name': user_display_name,
+    'joined': User.date_joined
+}
+
+class KeysetPage:
+    """One page of a keyset-paginated query, navigated by (sort value, id) cursors instead of OFFSET"""
+
+    def __init__(self, rows, has_next, has_prev):
+        self.items = [user for user, _ in rows]
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_after = encode_cursor(rows[-1][1], rows[-1][0].id) if rows and has_next else None
+        self.prev_before = encode_cursor(rows[0][1], rows[0][0].id) if rows and has_prev else None
+
+def encode_cursor(value, user_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return json.dumps([value, user_id], separators=(',', ':'))
+
+def decode_cursor(token, sort):
+    """Parse a cursor token, returning (value, id) or None if it is malformed"""
+    try:
+        value, user_id = json.loads(token)
+        if sort == 'joined' and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+def keyset_paginate(query, per_page, sort='id', descending=False, after=None, before=None):
+    """Return a KeysetPage of rows after/before a cursor, ordered by the sort expression then id"""
+    expression = ADMIN_USER_SORTS[sort]
+    query = query.add_columns(expression.label('sort_key'))
+    
+    def past(cursor, forward):
+        value, user_id = cursor
+        greater = forward != descending
+        if greater:
+            return db.or_(expression > value, db.and_(expression == value, User.id > user_id))
+        return db.or_(expression < value, db.and_(expression == value, User.id < user_id))
+    
+    def ordered(forward):
+        if forward != descending:
+            return (expression.asc(), User.id.asc())
+        return (expression.desc(), User.id.desc())
+    
+    if before is not None:
+        rows = query.filter(past(before, forward=False)).order_by(*ordered(False)).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        return KeysetPage(list(reversed(rows[:per_page])), has_next=True, has_prev=has_prev)
+    
+    if after is not None:
+        query = query.filter(past(after, forward=True))
+    rows = query.order_by(*ordered(True)).limit(per_page + 1).all()
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_prev=after is not None)
+
+def estimate_count(query):
+    """Return the planner's row estimate for a query, or None if the database can't provide one"""
+    if db.engine.dialect.name != 'postgresql':
+        return None
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    return estimate if estimate > 0 else None
+
+def get_total(query, cache_key, exact=False):
+    """Return (total, is_exact) for a listing, cached for ADMIN_COUNT_CACHE_TTL seconds"""
+    cached = _count_cache.get(cache_key)
+    if not exact and cached and time.monotonic() - cached[2] < app.config['ADMIN_COUNT_CACHE_TTL']:
+        return cached[0], cached[1]
+    
+    total, is_exact = (None, False) if exact else (estimate_count(query), False)
+    if total is None:
+        total, is_exact = query.order_by(None).count(), True
+    _count_cache[cache_key] = (total, is_exact, time.monotonic())
+    return total, is_exact
+
+def admin_user_filters(args=None):
+    """Build the admin user list query from the filter form, returning (query, active filters)"""
+    args = request.args if args is None else args
+    query = User.query
+    filters = {}
+    
+    def prefix_range(expression, prefix):
+        # A range instead of LIKE so the lower() expression index is used under any collation
+        prefix = prefix.strip().lower()
+        return db.and_(expression >= prefix, expression < prefix + '\U0010ffff')
+    
+    if args.get('email'):
+        filters['email'] = args['email']
+        query = query.filter(prefix_range(db.func.lower(User.email), args['email']))
+    if args.get('name'):
+        filters['name'] = args['name']
+        query = query.filter(db.or_(
+            prefix_range(db.func.lower(User.full_name), args['name']),
+            prefix_range(db.func.lower(User.company_name), args['name'])
+        ))
+    if args.get('user_type') in ('member', 'company'):
+        filters['user_type'] = args['user_type']
+        query = query.filter(User.user_type == args['user_type'])
+    for flag in ('is_active', 'is_verified', 'is_admin'):
+        if args.get(flag) in ('1', '0'):
+            filters[flag] = args[flag]
+            query = query.filter(getattr(User, flag) == (args[flag] == '1'))
+    if args.get('country'):
+        filters['country'] = args['country']
+        query = query.filter(db.or_(country_condition('university_country', args['country']),
+                                    country_condition('company_country', args['country'])))
+    for name, op in (('joined_from', '__ge__'), ('joined_to', '__lt__')):
+        try:
+            day = datetime.strptime(args.get(name, ''), '%Y-%m-%d')
+        except ValueError:
+            continue
+        filters[name] = args[name]
+        if name == 'joined_to':
+            day += timedelta(days=1)  # inclusive end date
+        query = query.filter(getattr(User.date_joined, op)(day))
+    return query, filters
+
+# Broadcast mailer
+BROADCAST_AUDIENCE_FILTERS = ('user_type', 'is_active', 'is_verified', 'country', 'joined_from', 'joined_to')
+BROADCAST_STALE_AFTER = timedelta(minutes=5)  # a 'sending' broadcast without a checkpoint for this long is presumed dead
+
+def render_broadcast(broadcast, locale):
+    """Render the email body for one locale"""
+    with force_locale(locale):
+        return render_template('emails/broadcast.html', broadcast=broadcast)
+
+def _checkpoint_broadcast(broadcast_id, statuses, **values):
+    """Record a chunk's per-recipient statuses and advance the resume point in one transaction"""
+    if statuses:
+        db.session.execute(BroadcastRecipient.__table__.insert(), statuses)
+        values['last_user_id'] = statuses[-1]['user_id']
+    sent = sum(1 for status in statuses if status['status'] == 'sent')
+    Broadcast.query.filter_by(id=broadcast_id).update(dict(
+        values,
+        sent_count=Broadcast.sent_count + sent,
+        failed_count=Broadcast.failed_count + len(statuses) - sent,
+        checkpoint_at=datetime.utcnow()
+    ), synchronize_session=False)
+    db.session.commit()
+
+def run_broadcast(broadcast_id):
+    """Send a broadcast from its last checkpoint; returns False if it is not claimable (done or running elsewhere)"""
+    now = datetime.utcnow()
+    claimed = Broadcast.query.filter(Broadcast.id == broadcast_id, db.or_(
+        Broadcast.status.in_(('queued', 'paused')),
+        db.and_(Broadcast.status == 'sending', Broadcast.checkpoint_at < now - BROADCAST_STALE_AFTER)
+    )).update({'status': 'sending', 'checkpoint_at': now, 'last_error': None}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return False
+    
+    broadcast = db.session.get(Broadcast, broadcast_id)
+    audience, _ = admin_user_filters(json.loads(broadcast.audience))
+    audience = audience.with_entities(User.id, User.email, User.language).order_by(User.id)
+    chunk_size = app.config['BROADCAST_CHUNK_SIZE']
+    interval = 1.0 / app.config['BROADCAST_RATE_LIMIT'] if app.config['BROADCAST_RATE_LIMIT'] > 0 else 0
+    bodies = {}  # locale -> rendered html, each rendered once
+    last_user_id = broadcast.last_user_id
+    next_send = time.monotonic()
+    
+    while True:
+        # Keyset chunks over the primary key: constant memory, and each chunk ends at a committed checkpoint
+        chunk = audience.filter(User.id > last_user_id).limit(chunk_size).all()
+        if not chunk:
+            break
+        statuses = []
+        try:
+            # One SMTP session per chunk instead of one per message
+            with mail.connect() as connection:
+                for user_id, email, language in chunk:
+                    locale = language if language in app.config['LANGUAGES'] else 'en'
+                    if locale not in bodies:
+                        bodies[locale] = render_broadcast(broadcast, locale)
+                    
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_send = max(next_send, time.monotonic()) + interval
+                    
+                    status = {'broadcast_id': broadcast_id, 'user_id': user_id, 'status': 'sent', 'error': None}
+                    try:
+                        connection.send(Message(subject=broadcast.subject, recipients=[email], html=bodies[locale],
+                                                sender=app.config['MAIL_DEFAULT_SENDER']))
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                        status.update(status='failed', error=str(e)[:300])
+                    status['sent_at'] = datetime.utcnow()
+                    statuses.append(status)
+        except Exception as e:
+            # Connection-level failure: keep what was delivered and pause for a resume
+            db.session.rollback()
+            _checkpoint_broadcast(broadcast_id, statuses, status='paused', last_error=str(e)[:1000])
+            print(f"Broadcast {broadcast_id} paused: {e}")
+            return True
+        
+        _checkpoint_broadcast(broadcast_id, statuses)
+        last_user_id = statuses[-1]['user_id']
+        # An admin may have paused the broadcast while this chunk was sending
+        if db.session.query(Broadcast.status).filter_by(id=broadcast_id).scalar() != 'sending':
+            return True
+    
+    Broadcast.query.filter_by(id=broadcast_id).update({'status': 'done', 'finished_at': datetime.utcnow()},
+                                                      synchronize_session=False)
+    db.session.commit()
+    return True
+
+def start_broadcast(broadcast_id):
+    """Send a broadcast from a separate 'flask send-broadcast' process so the admin request returns immediately
+
+    A thread would die with the web worker when gunicorn recycles it (max_requests); the process outlives it.
+    """
+    subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'send-broadcast', str(broadcast_id)],
+                     cwd=app.root_path, start_new_session=True)
+
+def stalled_broadcast_ids():
+    """Broadcasts whose sender died mid-run or never started, oldest first"""
+    cutoff = datetime.utcnow() - BROADCAST_STALE_AFTER
+    return [broadcast_id for broadcast_id, in db.session.query(Broadcast.id).filter(db.or_(
+        db.and_(Broadcast.status == 'queued', Broadcast.created_at < cutoff),
+        db.and_(Broadcast.status == 'sending', Broadcast.checkpoint_at < cutoff)
+    )).order_by(Broadcast.id)]
+
 # Admin routes
 @app.route('/admin')
 @login_required
@@ -647,11 +2596,21 @@ def admin_dashboard():
 @login_required
 @admin_required
 def admin_users():
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(
-        page=page, per_page=20, error_out=False
+    query, filters = admin_user_filters()
+    sort = request.args.get('sort') if request.args.get('sort') in ADMIN_USER_SORTS else 'id'
+    descending = request.args.get('dir') == 'desc'
+    users = keyset_paginate(
+        query,
+        per_page=app.config['ADMIN_USERS_PER_PAGE'],
+        sort=sort,
+        descending=descending,
+        after=decode_cursor(request.args.get('after'), sort),
+        before=decode_cursor(request.args.get('before'), sort)
     )
-    return render_template('admin/users.html', users=users)
+    cache_key = tuple(sorted(filters.items()))
+    total, total_is_exact = get_total(query, cache_key, exact=request.args.get('exact') == '1')
+    return render_template('admin/users.html', users=users, total=total, total_is_exact=total_is_exact,
+                           filters=filters, sort=sort, descending=descending)
 
 @app.route('/admin/user/<int:user_id>')
 @login_required
@@ -666,7 +2625,10 @@ def admin_user_detail(user_id):
 def admin_toggle_user_status(user_id):
     user = User.query.get_or_404(user_id)
     user.is_active = not user.is_active
+    user.updated_at = datetime.utcnow()
+    profile_changed.send(app, user=user, changes={'is_active': (not user.is_active, user.is_active)})
     db.session.commit()
+    audit('user.activate' if user.is_active else 'user.deactivate', user)
     flash(f'User {user.full_name or user.company_name} status updated!', 'success')
     return redirect(url_for('admin_user_detail', user_id=user_id))
 
@@ -675,15 +2637,145 @@ def admin_toggle_user_status(user_id):
 @admin_required
 def admin_make_admin(user_id):
     user = User.query.get_or_404(user_id)
-    user.is_admin = True
-    db.session.commit()
+    if not user.is_admin:
+        user.is_admin = True
+        user.updated_at = datetime.utcnow()
+        profile_changed.send(app, user=user, changes={'is_admin': (False, True)})
+        db.session.commit()
+    audit('user.make_admin', user)
     flash(f'{user.full_name or user.company_name} is now an admin!', 'success')
     return redirect(url_for('admin_user_detail', user_id=user_id))
 
+@app.route('/admin/audit')
+@login_required
+@admin_required
+def admin_audit_log():
+    query = AuditLog.query
+    filters = {}
+    if request.args.get('action'):
+        filters['action'] = request.args['action']
+        query = query.filter(AuditLog.action == filters['action'])
+    target_user_id = request.args.get('target_user_id', type=int)
+    if target_user_id:
+        filters['target_user_id'] = target_user_id
+        query = query.filter(AuditLog.target_user_id == target_user_id)
+    
+    # Newest first, paged by id so deep pages stay cheap on a large log
+    before = request.args.get('before', type=int)
+    if before:
+        query = query.filter(AuditLog.id < before)
+    per_page = app.config['ADMIN_USERS_PER_PAGE']
+    events = query.order_by(AuditLog.id.desc()).limit(per_page + 1).all()
+    next_before = events[per_page - 1].id if len(events) > per_page else None
+    return render_template('admin/audit.html', events=events[:per_page], next_before=next_before, filters=filters)
+
+@app.route('/admin/broadcasts', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_broadcasts():
+    if request.method == 'POST':
+        subject = request.form.get('subject', '').strip()
+        body = request.form.get('body', '').replace('\r\n', '\n').strip()
+        if not subject or not body:
+            flash('Subject and message are required.', 'error')
+            return redirect(url_for('admin_broadcasts'))
+        
+        audience, filters = admin_user_filters({name: request.form.get(name, '') for name in BROADCAST_AUDIENCE_FILTERS})
+        broadcast = Broadcast(subject=subject, body=body, audience=json.dumps(filters), created_by=current_user.id)
+        db.session.add(broadcast)
+        db.session.commit()
+        audit('broadcast.create', None, broadcast_id=broadcast.id, subject=subject, audience=filters)
+        start_broadcast(broadcast.id)
+        flash(f'Broadcast queued for {audience.count()} recipients.', 'success')
+        return redirect(url_for('admin_broadcast_detail', broadcast_id=broadcast.id))
+    
+    broadcasts = Broadcast.query.order_by(Broadcast.id.desc()).limit(50).all()
+    return render_template('admin/broadcasts.html', broadcasts=broadcasts)
+
+@app.route('/admin/broadcasts/<int:broadcast_id>')
+@login_required
+@admin_required
+def admin_broadcast_detail(broadcast_id):
+    broadcast = Broadcast.query.get_or_404(broadcast_id)
+    failures = db.session.query(BroadcastRecipient, User.email).outerjoin(
+        User, User.id == BroadcastRecipient.user_id
+    ).filter(BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.status == 'failed').order_by(
+        BroadcastRecipient.user_id
+    ).limit(200).all()
+    return render_template('admin/broadcast_detail.html', broadcast=broadcast, audience=json.loads(broadcast.audience),
+                           failures=failures)
+
+@app.route('/admin/broadcasts/<int:broadcast_id>/pause', methods=['POST'])
+@login_required
+@admin_required
+def admin_pause_broadcast(broadcast_id):
+    # The sender notices at its next checkpoint and stops after the current chunk
+    Broadcast.query.filter_by(id=broadcast_id, status='sending').update({'status': 'paused'})
+    db.session.commit()
+    audit('broadcast.pause', None, broadcast_id=broadcast_id)
+    flash('Broadcast will pause after the current chunk.', 'success')
+    return redirect(url_for('admin_broadcast_detail', broadcast_id=broadcast_id))
+
+@app.route('/admin/broadcasts/<int:broadcast_id>/resume', methods=['POST'])
+@login_required
+@admin_required
+def admin_resume_broadcast(broadcast_id):
+    broadcast = Broadcast.query.get_or_404(broadcast_id)
+    if broadcast.status == 'done':
+        flash('This broadcast has already finished.', 'error')
+        return redirect(url_for('admin_broadcast_detail', broadcast_id=broadcast_id))
+    audit('broadcast.resume', None, broadcast_id=broadcast_id)
+    start_broadcast(broadcast_id)
+    flash('Broadcast resumed from its last checkpoint.', 'success')
+    return redirect(url_for('admin_broadcast_detail', broadcast_id=broadcast_id))
+
+@app.route('/admin/profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    profiles = []
+    if os.path.isdir(profile_dir):
+        for filename in sorted(os.listdir(profile_dir), reverse=True):
+            path = os.path.join(profile_dir, filename)
+            profiles.append({
+                'filename': filename,
+                'size_kb': round(os.path.getsize(path) / 1024, 1),
+                'created_at': datetime.utcfromtimestamp(os.path.getmtime(path))
+            })
+    return render_template('admin/profiles.html', profiles=profiles)
+
+@app.route('/admin/profiles/<filename>')
+@login_required
+@admin_required
+def admin_profile_download(filename):
+    return send_from_directory(os.path.abspath(profile_dir), secure_filename(filename), as_attachment=True)
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                    if column.server_default is not None:
+                        ddl += f' DEFAULT {column.server_default.arg.text}'
+                    connection.execute(db.text(ddl))
+                    print(f"✅ Added column {table.name}.{column.name}")
+    
+    # Reflection misses expression indexes on some backends, so let the database skip existing ones
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
 def init_db():
     """Initialize database tables"""
     try:
         db.create_all()
+        upgrade_schema()
         print("✅ Database tables created successfully!")
         
         # Verify table exists by trying to query it
@@ -740,6 +2832,66 @@ def create_default_admin():
         print(f"❌ Error creating default admin: {e}")
         return False
 
+# ASGI serving (asgi.py)
+# Under an ASGI server, request bodies are read on the event loop into a spooled temporary file before a
+# thread from a2wsgi's pool runs Flask, so slow or large uploads hold a coroutine and a file, not a thread.
+class SpooledBodyMiddleware:
+    """ASGI middleware that buffers each request body (memory, then disk) before calling the wrapped app"""
+
+    def __init__(self, app, max_body_size, memory_size=1024 * 1024, chunk_size=64 * 1024):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.memory_size = memory_size
+        self.chunk_size = chunk_size
+
+    async def _reject(self, send, status, reason):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain'), (b'connection', b'close')]})
+        await send({'type': 'http.response.body', 'body': reason})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        
+        declared = dict(scope.get('headers') or []).get(b'content-length')
+        if declared and declared.isdigit() and int(declared) > self.max_body_size:
+            return await self._reject(send, 413, b'Request Entity Too Large')
+        
+        spool = tempfile.SpooledTemporaryFile(max_size=self.memory_size)
+        try:
+            size = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return  # client gave up mid-upload; the app never runs
+                body = message.get('body', b'')
+                size += len(body)
+                if size > self.max_body_size:
+                    return await self._reject(send, 413, b'Request Entity Too Large')
+                spool.write(body)
+                if not message.get('more_body', False):
+                    break
+            spool.seek(0)
+            more_body = True  # an empty body is still delivered once
+            
+            async def replay():
+                nonlocal more_body
+                if not more_body:
+                    return await receive()  # body delivered: only a disconnect can follow
+                chunk = spool.read(self.chunk_size)
+                more_body = spool.tell() < size
+                return {'type': 'http.request', 'body': chunk, 'more_body': more_body}
+            
+            await self.app(scope, replay, send)
+        finally:
+            spool.close()
+
+def create_asgi_app():
+    """The Flask app as an ASGI application: spooled request bodies, views on a thread pool of ASGI_THREADS"""
+    from a2wsgi import WSGIMiddleware  # only the ASGI deployment needs it
+    return SpooledBodyMiddleware(WSGIMiddleware(app, workers=app.config['ASGI_THREADS']),
+                                 app.config['MAX_CONTENT_LENGTH'], memory_size=app.config['ASGI_SPOOL_MEMORY'])
+
 # Flask CLI commands
 @app.cli.command()
 def create_admin():
@@ -793,9 +2945,158 @@ def create_admin():
     print(f"👤 Name: {admin_user.full_name}")
     print("🌐 You can now login at: http://localhost:5001/login")
 
+@app.cli.command('refresh-featured')
+def refresh_featured_command():
+    """Rebuild the homepage featured rotation (run from cron)"""
+    count = refresh_featured()
+    if count is None:
+        print("⏭️  Another featured refresh is still running; skipped")
+    else:
+        print(f"✅ Featured rotation refreshed with {count} slots")
+
+@app.cli.command('rebuild-facets')
+def rebuild_facets_command():
+    """Recompute directory facet counts from scratch (repairs drift)"""
+    count = rebuild_facets()
+    print(f"✅ Rebuilt {count} facet counts")
+
+@app.cli.command('rebuild-similar')
+def rebuild_similar_command():
+    """Rebuild the similar-members index and top-K lists (run from cron)"""
+    count = rebuild_similar()
+    print(f"✅ Rebuilt similar members for {count} members")
+
+@app.cli.command('load-universities')
+def load_universities_command():
+    """Load the bundled university dataset and email-domain index"""
+    universities, domains = load_universities()
+    print(f"✅ Loaded {universities} universities and {domains} email domains")
+
+@app.cli.command('backfill-universities')
+def backfill_universities_command():
+    """Link existing members to a university by their email domain"""
+    linked = backfill_universities()
+    print(f"✅ Linked {linked} members to a university")
+    if linked:
+        print("🔧 Run 'flask rebuild-facets' to regroup university counts")
+
+@app.cli.command('load-countries')
+def load_countries_command():
+    """Load the country reference table and its aliases"""
+    countries, aliases = load_countries()
+    print(f"✅ Loaded {countries} countries and {aliases} aliases")
+
+@app.cli.command('backfill-countries')
+def backfill_countries_command():
+    """Map existing free-text country values to the country table"""
+    updated, unmatched = backfill_countries()
+    print(f"✅ Linked {updated} users to a country")
+    for value, count in unmatched.most_common(20):
+        print(f"⚠️  Unrecognised country {value!r} ({count} users)")
+    if updated:
+        print("🔧 Run 'flask rebuild-facets' and 'flask refresh-featured' to regroup counts by country")
+
+@app.cli.command('backfill-study-periods')
+def backfill_study_periods_command():
+    """Fill the typed study-period columns from the free-text start/end dates"""
+    updated, failures = backfill_study_periods()
+    print(f"✅ Backfilled study periods for {updated} members")
+    for user_id, field, value in failures:
+        print(f"⚠️  User {user_id}: could not parse {field} {value!r}")
+    if updated:
+        print("🔧 Run 'flask rebuild-similar' so similar members use the new study years")
+
+@app.cli.command('build-sitemaps')
+def build_sitemaps_command():
+    """Rewrite changed child sitemaps ahead of crawler traffic (needs SITEMAP_BASE_URL)"""
+    base_url = app.config['SITEMAP_BASE_URL']
+    if not base_url:
+        print("❌ Set SITEMAP_BASE_URL to the public site URL first")
+        return
+    with app.test_request_context(base_url=base_url):
+        chunks, rewritten = refresh_sitemaps(base_url)
+    print(f"✅ Sitemap index has {len(chunks)} child sitemaps, {rewritten} rewritten")
+
+@app.cli.command('prune-audit')
+def prune_audit_command():
+    """Delete audit log entries older than AUDIT_RETENTION_DAYS"""
+    deleted = prune_audit_log(app.config['AUDIT_RETENTION_DAYS'])
+    print(f"✅ Pruned {deleted} audit log entries")
+
+@app.cli.command('send-broadcast')
+@click.argument('broadcast_id', type=int)
+def send_broadcast_command(broadcast_id):
+    """Send or resume a broadcast in the foreground"""
+    if not run_broadcast(broadcast_id):
+        print(f"❌ Broadcast {broadcast_id} is finished or already sending")
+        return
+    broadcast = db.session.get(Broadcast, broadcast_id)
+    print(f"✅ Broadcast {broadcast_id} {broadcast.status}: {broadcast.sent_count} sent, {broadcast.failed_count} failed")
+    if broadcast.last_error:
+        print(f"⚠️  {broadcast.last_error}")
+
+@app.cli.command('resume-broadcasts')
+def resume_broadcasts_command():
+    """Resume broadcasts whose sender died, e.g. on a restart (run from cron)"""
+    broadcast_ids = stalled_broadcast_ids()
+    if not broadcast_ids:
+        print("✅ No stalled broadcasts")
+    for broadcast_id in broadcast_ids:
+        if run_broadcast(broadcast_id):
+            broadcast = db.session.get(Broadcast, broadcast_id)
+            print(f"✅ Broadcast {broadcast_id} {broadcast.status}: {broadcast.sent_count} sent, {broadcast.failed_count} failed")
+
+assets_cli = AppGroup('assets', help='Static asset build commands.')
+
+@assets_cli.command('build')
+def build_assets():
+    """Minify and content-hash the JavaScript modules into static/dist"""
+    import rjsmin  # build-time dependency only
+    
+    os.makedirs(asset_dist_dir, exist_ok=True)
+    manifest = {}
+    for source in ASSET_SOURCES:
+        with open(os.path.join(app.static_folder, source), encoding='utf-8') as f:
+            original = f.read()
+        minified = rjsmin.jsmin(original)
+        name, extension = os.path.splitext(os.path.basename(source))
+        built = f"dist/{name}.{hashlib.sha256(minified.encode('utf-8')).hexdigest()[:10]}{extension}"
+        with open(os.path.join(app.static_folder, built), 'w', encoding='utf-8') as f:
+            f.write(minified)
+        manifest[source] = built
+        print(f"✅ {source} -> {built} ({len(original):,} -> {len(minified):,} bytes)")
+    
+    # Swap the manifest in atomically, then drop bundles from earlier builds
+    manifest_path = os.path.join(asset_dist_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    current = {os.path.basename(built) for built in manifest.values()} | {'manifest.json'}
+    for filename in os.listdir(asset_dist_dir):
+        if filename not in current:
+            os.remove(os.path.join(asset_dist_dir, filename))
+    _asset_manifest['loaded'] = False
+
+app.cli.add_command(assets_cli)
+
+templates_cli = AppGroup('templates', help='Template maintenance commands.')
+
+@templates_cli.command('compile')
+def compile_templates():
+    """Precompile all templates into the bytecode cache"""
+    compiled = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+        compiled += 1
+    print(f"✅ Compiled {compiled} templates into {jinja_cache_dir}")
+
+app.cli.add_command(templates_cli)
+
 # Initialize database after all models are defined
-with app.app_context():
-    initialize_database()
+# (SKIP_DB_INIT lets build steps such as `flask templates compile` import the app offline)
+if os.environ.get('SKIP_DB_INIT', '').lower() not in ('1', 'true'):
+    with app.app_context():
+        initialize_database()
 
 if __name__ == '__main__':
     # Removed duplicate init here - it's handled in the context block above
@@ -0,0 +1,14 @@
+"""
+ASGI entry point for Uzbek Global Network
+
+Serves the same app under an event loop, so slow clients and large uploads don't tie up a worker:
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn --config gunicorn.conf.py asgi:application
+or, without gunicorn:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+
+Set DB_POOL_SIZE to ASGI_THREADS so every view thread can hold a database connection.
+"""
+
+from app import create_asgi_app
+
+application = create_asgi_app()
@@ -6,10 +6,20 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///youthclub.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connections per worker process; match it to the threads serving requests (GUNICORN_THREADS or ASGI_THREADS)
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': int(os.environ['DB_POOL_SIZE'])} if os.environ.get('DB_POOL_SIZE') else {}
     
     # File upload configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'static/uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB
+    UPLOADS_ACCEL_REDIRECT = os.environ.get('UPLOADS_ACCEL_REDIRECT')  # nginx internal location, e.g. '/protected-uploads/'
+    
+    # ASGI serving mode (asgi.py)
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))  # threads running Flask views per worker
+    ASGI_SPOOL_MEMORY = int(os.environ.get('ASGI_SPOOL_MEMORY', 1024 * 1024))  # request body bytes kept in memory before spilling to disk
+    
+    # Template configuration
+    JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR')  # defaults to instance/jinja_cache
     
     # Security configuration
     WTF_CSRF_ENABLED = os.environ.get('WTF_CSRF_ENABLED', 'True').lower() == 'true'
@@ -26,8 +36,54 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
     
+    # Admin broadcasts
+    BROADCAST_CHUNK_SIZE = int(os.environ.get('BROADCAST_CHUNK_SIZE', 100))  # recipients per SMTP session and checkpoint
+    BROADCAST_RATE_LIMIT = float(os.environ.get('BROADCAST_RATE_LIMIT', 10))  # messages per second, 0 disables the cap
+    
+    # Homepage featured rotation
+    FEATURED_CACHE_TTL = int(os.environ.get('FEATURED_CACHE_TTL', 60))  # seconds a worker keeps the snapshot in memory
+    COUNTRY_INDEX_TTL = int(os.environ.get('COUNTRY_INDEX_TTL', 3600))  # seconds a worker keeps the country alias index
+    UNIVERSITY_INDEX_TTL = int(os.environ.get('UNIVERSITY_INDEX_TTL', 3600))  # seconds a worker keeps the email-domain index
+    FEATURED_REFRESH_INTERVAL = int(os.environ.get('FEATURED_REFRESH_INTERVAL', 3600))  # seconds between 'flask refresh-featured' cron runs
+    FEATURED_REFRESH_TIMEOUT = int(os.environ.get('FEATURED_REFRESH_TIMEOUT', 600))  # seconds before a crashed refresh's lock is taken over
+    
+    # Anonymous full-page cache
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'True').lower() == 'true'
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 60))  # seconds a page is fresh
+    PAGE_CACHE_STALE_TTL = int(os.environ.get('PAGE_CACHE_STALE_TTL', 300))  # extra seconds served stale while revalidating
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    PAGE_CACHE_SYNC_INTERVAL = float(os.environ.get('PAGE_CACHE_SYNC_INTERVAL', 2.0))  # seconds between checks for other workers' purges
+    
+    # Sitemaps
+    SITEMAP_URLS_PER_FILE = int(os.environ.get('SITEMAP_URLS_PER_FILE', 50000))  # user ids per child sitemap (protocol maximum)
+    SITEMAP_CHECK_INTERVAL = int(os.environ.get('SITEMAP_CHECK_INTERVAL', 600))  # seconds between checks for changed chunks
+    SITEMAP_BASE_URL = os.environ.get('SITEMAP_BASE_URL')  # canonical site URL; required for /sitemap.xml outside debug and tests
+    SITEMAP_DIR = os.environ.get('SITEMAP_DIR')  # defaults to instance/sitemaps
+    
+    # Admin listing
+    ADMIN_USERS_PER_PAGE = int(os.environ.get('ADMIN_USERS_PER_PAGE', 20))
+    ADMIN_COUNT_CACHE_TTL = int(os.environ.get('ADMIN_COUNT_CACHE_TTL', 300))  # seconds a user total is reused
+    
+    # Audit log
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2.0))  # seconds between background flushes
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_RETENTION_DAYS = int(os.environ.get('AUDIT_RETENTION_DAYS', 365))
+    
+    # Profile view counters
+    VIEW_FLUSH_INTERVAL = float(os.environ.get('VIEW_FLUSH_INTERVAL', 10.0))  # seconds between batched upserts
+    
+    # Health checks
+    READINESS_CACHE_TTL = float(os.environ.get('READINESS_CACHE_TTL', 5.0))  # seconds a /readyz result is reused
+    
+    # On-demand request profiler
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # defaults to instance/profiles
+    PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # profile 1 in N requests, 0 disables sampling
+    PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.001))  # seconds between stack samples
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+    
     # Rate limiting
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'  # disable for load benchmarks
     
     # Admin configuration
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'admin@youthclub.com')
@@ -47,6 +103,9 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+    
+    # Templates are precompiled at build time, never re-stat them per request
+    TEMPLATES_AUTO_RELOAD = False
 
 class TestingConfig(Config):
     """Testing configuration"""
@@ -0,0 +1,58 @@
+"""
+Gunicorn configuration for Uzbek Global Network
+
+Every setting can be overridden from the environment, e.g.
+    GUNICORN_WORKERS=8 GUNICORN_THREADS=4 gunicorn --config gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+# Server socket
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Worker processes: (2 x CPU) + 1 by default; WEB_CONCURRENCY is the usual platform override
+workers = int(os.environ.get('GUNICORN_WORKERS') or os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# 'sync' for CPU-bound pages, 'gthread' (implied by GUNICORN_THREADS > 1) or 'gevent' for I/O-bound routes;
+# 'uvicorn.workers.UvicornWorker' serves asgi:application instead of app:app (see asgi.py)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or ('gthread' if threads > 1 else 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))  # gevent only
+
+if worker_class == 'gevent':
+    # Patch before the app (and its database driver) is imported by preload_app
+    from gevent import monkey
+    monkey.patch_all()
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Load the app once in the master so workers share its memory copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Recycle workers periodically; jitter keeps them from all restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Logging
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master (opened by initialize_database())"""
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False leaves the parent's sockets alone; the child just forgets them
+            engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    """Write buffered audit events and profile views before the worker goes away"""
+    from app import audit_buffer, view_counter
+    audit_buffer.flush()
+    view_counter.flush()
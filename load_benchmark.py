@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Simple HTTP load benchmark for Uzbek Global Network
+
+Start the server the way it runs in production, then point this script at it:
+    gunicorn --config gunicorn.conf.py app:app
+    python load_benchmark.py --url http://localhost:5000 --concurrency 32 --requests 2000
+
+Compare the sync and ASGI serving modes by running both and passing both URLs:
+    gunicorn --config gunicorn.conf.py app:app
+    GUNICORN_BIND=0.0.0.0:5001 GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn --config gunicorn.conf.py asgi:application
+    python load_benchmark.py --url http://localhost:5000 http://localhost:5001 --uploads 40 --slow-clients 16
+
+Set RATELIMIT_ENABLED=False on the servers, or the login and reset limits will show up as errors.
+
+Measured on one CPU with SQLite, 2 workers per server and 16 concurrent clients
+(--requests 500 --uploads 40 --upload-mb 4 --slow-clients 4):
+    sync   mixed 767 req/s (p99 30 ms)   4 MB upload p50 358 ms   with 4 slow clients: 2 req/s, 64 timeouts
+    ASGI   mixed 790 req/s (p99 36 ms)   4 MB upload p50 366 ms   with 4 slow clients: 627 req/s, p99 48 ms
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = ['/', '/members', '/companies', '/contact', '/register']
+UPLOAD_PATH = '/register/member'  # mismatched passwords: the form is parsed, then rejected before anything is saved
+
+
+def fetch(url):
+    """Request a URL (or urllib Request) and return (status, seconds)"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, results, elapsed):
+    """Print throughput and latency percentiles for one scenario"""
+    latencies = [seconds for _, seconds in results]
+    errors = sum(1 for status, _ in results if status == 0 or status >= 400)
+    print(f"{name:<24} {len(results) / elapsed:>8.1f} req/s  "
+          f"p50 {statistics.median(latencies) * 1000:>7.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:>7.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:>7.1f} ms  "
+          f"errors {errors}")
+
+
+def run_paths(base_url, paths, concurrency, total):
+    """Hit the given paths round-robin from `concurrency` threads"""
+    urls = [base_url.rstrip('/') + paths[i % len(paths)] for i in range(total)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, urls))
+    return results, time.perf_counter() - started
+
+
+def multipart(fields, files):
+    """Encode a multipart/form-data body; returns (content type, body)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def run_uploads(base_url, megabytes, concurrency, total):
+    """POST `total` registration forms carrying a `megabytes` photo from `concurrency` threads"""
+    content_type, body = multipart(
+        {'email': 'benchmark@example.com', 'password': 'benchmark-one', 'confirm_password': 'benchmark-two'},
+        {'photo': ('photo.jpg', os.urandom(int(megabytes * 1024 * 1024)))}
+    )
+    requests = [urllib.request.Request(base_url.rstrip('/') + UPLOAD_PATH, data=body, method='POST',
+                                       headers={'Content-Type': content_type}) for _ in range(total)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, requests))
+    return results, time.perf_counter() - started
+
+
+def slow_client(base_url, stop, interval):
+    """Hold one request open by trickling its body a byte at a time until `stop` is set"""
+    parts = urlsplit(base_url)
+    try:
+        with socket.create_connection((parts.hostname, parts.port or 80), timeout=60) as sock:
+            sock.sendall(f'POST {UPLOAD_PATH} HTTP/1.1\r\nHost: {parts.netloc}\r\n'
+                         f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: 1000000\r\n\r\n'.encode())
+            while not stop.wait(interval):
+                sock.sendall(b'a')
+    except OSError:
+        pass
+
+
+def run_with_slow_clients(base_url, paths, slow_clients, concurrency, total, interval=0.5):
+    """Run the mixed scenario while `slow_clients` connections trickle request bodies"""
+    stop = threading.Event()
+    threads = [threading.Thread(target=slow_client, args=(base_url, stop, interval), daemon=True)
+               for _ in range(slow_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)  # let every slow client get its request in front of a worker
+    try:
+        return run_paths(base_url, paths, concurrency, total)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', nargs='+', default=['http://localhost:5000'], help='one or more servers to compare')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--uploads', type=int, default=0, help='multipart uploads to send (0 skips the scenario)')
+    parser.add_argument('--upload-mb', type=float, default=4.0, help='size of each uploaded file')
+    parser.add_argument('--slow-clients', type=int, default=0, help='trickling connections held open during a mixed run')
+    args = parser.parse_args()
+
+    for base_url in args.url:
+        print(f"🔧 {args.requests} requests, {args.concurrency} concurrent, against {base_url}")
+        # One cold pass first so caches and compiled templates are warm
+        run_paths(base_url, args.paths, 1, len(args.paths))
+
+        for path in args.paths:
+            results, elapsed = run_paths(base_url, [path], args.concurrency, args.requests // len(args.paths))
+            report(path, results, elapsed)
+        results, elapsed = run_paths(base_url, args.paths, args.concurrency, args.requests)
+        report('mixed', results, elapsed)
+
+        if args.uploads:
+            results, elapsed = run_uploads(base_url, args.upload_mb, args.concurrency, args.uploads)
+            report(f'upload {args.upload_mb:g} MB', results, elapsed)
+        if args.slow_clients:
+            results, elapsed = run_with_slow_clients(base_url, args.paths, args.slow_clients, args.concurrency,
+                                                     args.requests)
+            report(f'mixed + {args.slow_clients} slow', results, elapsed)
+        print()
+
+
+if __name__ == '__main__':
+    main()
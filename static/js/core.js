@@ -0,0 +1,21 @@
+// Shared core, loaded on every page. Page-specific behaviour lives in its own module
+// (home.js, register.js) and is only loaded by the templates that need it.
+
+// Auto-hide alerts after 5 seconds
+document.querySelectorAll('.alert').forEach(function(alert) {
+    setTimeout(function() {
+        const bsAlert = new bootstrap.Alert(alert);
+        bsAlert.close();
+    }, 5000);
+});
+
+// Form validation
+document.querySelectorAll('form').forEach(function(form) {
+    form.addEventListener('submit', function(event) {
+        if (!form.checkValidity()) {
+            event.preventDefault();
+            event.stopPropagation();
+        }
+        form.classList.add('was-validated');
+    });
+});
@@ -1,51 +1,14 @@
-// Main JavaScript for Youth Club Community
+// Registration form: password strength, month-year pickers, country and university dropdowns
 
-document.addEventListener('DOMContentLoaded', function() {
-    // Auto-hide alerts after 5 seconds
-    const alerts = document.querySelectorAll('.alert');
-    alerts.forEach(function(alert) {
-        setTimeout(function() {
-            const bsAlert = new bootstrap.Alert(alert);
-            bsAlert.close();
-        }, 5000);
+// Password strength indicator (basic)
+const passwordInput = document.getElementById('password');
+if (passwordInput) {
+    passwordInput.addEventListener('input', function() {
+        const password = this.value;
+        const strength = getPasswordStrength(password);
+        updatePasswordStrengthIndicator(strength);
     });
-    
-    // Form validation
-    const forms = document.querySelectorAll('form');
-    forms.forEach(function(form) {
-        form.addEventListener('submit', function(event) {
-            if (!form.checkValidity()) {
-                event.preventDefault();
-                event.stopPropagation();
-            }
-            form.classList.add('was-validated');
-        });
-    });
-    
-    // Password strength indicator (basic)
-    const passwordInput = document.getElementById('password');
-    if (passwordInput) {
-        passwordInput.addEventListener('input', function() {
-            const password = this.value;
-            const strength = getPasswordStrength(password);
-            updatePasswordStrengthIndicator(strength);
-        });
-    }
-    
-    // Initialize month-year picker
-    initMonthYearPicker();
-    
-    // Initialize members carousel
-    initMembersCarousel();
-    
-    // Initialize country dropdowns
-    initCountryDropdowns();
-    
-    // Initialize university dropdowns (only if on registration page)
-    if (document.querySelector('.university-dropdown')) {
-        initUniversityDropdowns();
-    }
-});
+}
 
 function getPasswordStrength(password) {
     let strength = 0;
@@ -192,151 +155,6 @@ function showMonthYearPicker(type) {
     });
 }
 
-// Members Carousel functionality
-function initMembersCarousel() {
-    const carouselTrack = document.getElementById('carouselTrack');
-    const prevBtn = document.getElementById('prevBtn');
-    const nextBtn = document.getElementById('nextBtn');
-    const indicatorsContainer = document.getElementById('carouselIndicators');
-    
-    if (!carouselTrack || !prevBtn || !nextBtn) return;
-    
-    let currentIndex = 0;
-    let autoScrollInterval;
-    let isAutoScrolling = true;
-    
-    // Get member cards from the DOM (already rendered by server)
-    const memberCards = carouselTrack.querySelectorAll('.member-card-carousel');
-    const memberCount = memberCards.length;
-    
-    // Create member cards (already rendered by server)
-    function createMemberCards() {
-        // Cards are already created by the server, no need to clone
-        if (memberCards.length === 0) return;
-    }
-    
-    // Create indicators
-    function createIndicators() {
-        indicatorsContainer.innerHTML = '';
-        for (let i = 0; i < memberCount; i++) {
-            const indicator = document.createElement('button');
-            indicator.className = `carousel-indicator ${i === 0 ? 'active' : ''}`;
-            indicator.addEventListener('click', () => goToSlide(i));
-            indicatorsContainer.appendChild(indicator);
-        }
-    }
-    
-    // Update indicators
-    function updateIndicators(index) {
-        const indicators = indicatorsContainer.querySelectorAll('.carousel-indicator');
-        indicators.forEach((indicator, i) => {
-            indicator.classList.toggle('active', i === index);
-        });
-    }
-    
-    // Go to specific slide
-    function goToSlide(index) {
-        currentIndex = index;
-        const cardWidth = 280 + 24; // card width + gap
-        const translateX = -currentIndex * cardWidth;
-        carouselTrack.style.transform = `translateX(${translateX}px)`;
-        updateIndicators(currentIndex);
-        
-        // Reset auto-scroll
-        if (isAutoScrolling) {
-            clearInterval(autoScrollInterval);
-            startAutoScroll();
-        }
-    }
-    
-    // Next slide
-    function nextSlide() {
-        currentIndex = (currentIndex + 1) % memberCount;
-        goToSlide(currentIndex);
-    }
-    
-    // Previous slide
-    function prevSlide() {
-        currentIndex = (currentIndex - 1 + memberCount) % memberCount;
-        goToSlide(currentIndex);
-    }
-    
-    // Start auto-scroll
-    function startAutoScroll() {
-        if (isAutoScrolling) {
-            autoScrollInterval = setInterval(nextSlide, 3000); // Change slide every 3 seconds
-        }
-    }
-    
-    // Stop auto-scroll
-    function stopAutoScroll() {
-        clearInterval(autoScrollInterval);
-    }
-    
-    // Event listeners
-    nextBtn.addEventListener('click', () => {
-        stopAutoScroll();
-        nextSlide();
-        isAutoScrolling = false;
-    });
-    
-    prevBtn.addEventListener('click', () => {
-        stopAutoScroll();
-        prevSlide();
-        isAutoScrolling = false;
-    });
-    
-    // Pause auto-scroll on hover
-    carouselTrack.addEventListener('mouseenter', stopAutoScroll);
-    carouselTrack.addEventListener('mouseleave', () => {
-        isAutoScrolling = true;
-        startAutoScroll();
-    });
-    
-    // Touch/swipe support for mobile
-    let startX = 0;
-    let isDragging = false;
-    
-    carouselTrack.addEventListener('touchstart', (e) => {
-        startX = e.touches[0].clientX;
-        isDragging = true;
-        stopAutoScroll();
-    });
-    
-    carouselTrack.addEventListener('touchmove', (e) => {
-        if (!isDragging) return;
-        e.preventDefault();
-    });
-    
-    carouselTrack.addEventListener('touchend', (e) => {
-        if (!isDragging) return;
-        
-        const endX = e.changedTouches[0].clientX;
-        const diff = startX - endX;
-        
-        if (Math.abs(diff) > 50) { // Minimum swipe distance
-            if (diff > 0) {
-                nextSlide();
-            } else {
-                prevSlide();
-            }
-        }
-        
-        isDragging = false;
-        isAutoScrolling = true;
-        startAutoScroll();
-    });
-    
-    // Initialize carousel
-    createMemberCards();
-    createIndicators();
-    startAutoScroll();
-    
-    // Handle window resize
-    window.addEventListener('resize', () => {
-        goToSlide(currentIndex);
-    });
-}
 
 // Country Dropdown functionality
 function initCountryDropdowns() {
@@ -865,3 +683,9 @@ function initUniversityDropdowns() {
     // Initialize with empty state
     list.innerHTML = '<div class="university-no-results">Select a country to see universities</div>';
 }
+
+initMonthYearPicker();
+initCountryDropdowns();
+if (document.querySelector('.university-dropdown')) {
+    initUniversityDropdowns();
+}
@@ -1,7 +1,28 @@
 import pytest
 import os
+import json
 import tempfile
-from app import app, db, User
+import io
+import re
+import html
+from urllib.parse import parse_qs, urlsplit
+import shutil
+import email
+import socketserver
+import threading
+from datetime import datetime, timedelta
+from app import app, db, User, FeaturedSlot, FacetCount, SimilarMember, University, UniversityDomain
+from app import refresh_featured, rebuild_facets, rebuild_similar, load_university_domain_index, match_university, page_cache
+from app import encode_cursor, AuditLog, audit_buffer, ProfileViewDaily, view_counter, limiter, profile_changed
+from app import Broadcast, BroadcastRecipient, run_broadcast, _asset_manifest, backfill_study_periods
+from app import Country, CountryAlias, SiteStat, load_countries, backfill_countries, refresh_sitemaps, _sitemaps
+import xml.etree.ElementTree as ET
+import asyncio
+from app import SpooledBodyMiddleware, _revalidate_page, PAGE_CACHE_GENERATION
+from app import acquire_site_lock, release_site_lock, FEATURED_REFRESH_LOCK
+from app import backfill_universities, match_country, start_broadcast, stalled_broadcast_ids, _featured_cache
+from app import get_profile_views, upsert_view_counts_statement, remove_from_featured
+from sqlalchemy.exc import IntegrityError
 
 @pytest.fixture
 def client():
@@ -9,6 +30,9 @@ def client():
     app.config['TESTING'] = True
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     app.config['WTF_CSRF_ENABLED'] = False
+    page_cache.clear()
+    view_counter.counts.clear()  # unflushed views from earlier tests would land on reused user ids
+    limiter.enabled = False  # many tests log in; the login limit is 5 per minute
     
     with app.test_client() as client:
         with app.app_context():
@@ -62,6 +86,22 @@ def test_user_registration(client):
     assert user is not None
     assert user.full_name == 'Test User'
 
+def test_registration_ignores_unsupported_language(client):
+    """Test only supported ?lang= values are used as the locale and stored on new users"""
+    for lang, expected in [('uz', 'uz'), ('english-please', 'en')]:
+        client.post(f'/register/member?lang={lang}', data={
+            'email': f'lang-{lang}@example.com',
+            'password': 'testpassword123',
+            'confirm_password': 'testpassword123',
+            'full_name': 'Language User',
+            'university': 'Test University',
+            'university_country': 'Test Country',
+            'major': 'Test Major',
+            'start_date': '09-2020',
+            'end_date': '06-2024'
+        })
+        assert User.query.filter_by(email=f'lang-{lang}@example.com').first().language == expected
+
 def test_user_login(client):
     """Test user login"""
     # First create a user
@@ -99,5 +139,824 @@ def test_forgot_password_page(client):
     assert response.status_code == 200
     assert b'Forgot Password' in response.data
 
+def test_compile_templates_command():
+    """Test templates are precompiled into the bytecode cache"""
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['templates', 'compile'])
+    assert result.exit_code == 0
+    assert 'Compiled' in result.output
+    assert os.listdir(app.jinja_env.bytecode_cache.directory)
+
+def test_build_assets_command(client):
+    """Test JavaScript modules are minified into hashed bundles and only loaded where used"""
+    runner = app.test_cli_runner()
+    try:
+        result = runner.invoke(args=['assets', 'build'])
+        assert result.exit_code == 0
+        with open(os.path.join(app.static_folder, 'dist', 'manifest.json')) as f:
+            manifest = json.load(f)
+        assert set(manifest) == {'js/core.js', 'js/home.js', 'js/register.js'}
+        built = os.path.join(app.static_folder, manifest['js/register.js'])
+        assert os.path.getsize(built) < os.path.getsize(os.path.join(app.static_folder, 'js/register.js'))
+        
+        response = client.get('/members')
+        assert manifest['js/core.js'].encode() in response.data
+        assert b'register' not in response.data.split(b'<script type="module"', 1)[1]
+        response = client.get('/static/' + manifest['js/core.js'])
+        assert 'immutable' in response.headers['Cache-Control']
+        response.close()
+    finally:
+        shutil.rmtree(os.path.join(app.static_folder, 'dist'), ignore_errors=True)
+        _asset_manifest['loaded'] = False
+
+def test_featured_rotation(client):
+    """Test the homepage reads featured members from the rotation snapshot"""
+    for i in range(12):
+        user = User(
+            email=f'member{i}@example.com',
+            full_name=f'Featured Member {i}',
+            user_type='member',
+            photo_filename=f'photo{i}.jpg' if i % 2 == 0 else None
+        )
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    
+    refresh_featured()
+    hero = FeaturedSlot.query.filter_by(slot='hero').all()
+    assert len(hero) == 6  # only photo-complete members
+    assert all(slot.photo_filename for slot in hero)
+    
+    response = client.get('/')
+    assert response.status_code == 200
+    assert hero[0].full_name.encode() in response.data
+    
+    # Refreshes are serialized across workers, and the snapshot holds one row per slot position
+    assert acquire_site_lock(FEATURED_REFRESH_LOCK, 600)
+    assert refresh_featured() is None
+    assert FeaturedSlot.query.filter_by(slot='hero').count() == 6
+    release_site_lock(FEATURED_REFRESH_LOCK)
+    assert refresh_featured() == 12  # six hero and six member slots
+    db.session.add(FeaturedSlot(slot='hero', position=0, user_id=hero[0].user_id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+def test_homepage_never_migrates_schema(client, monkeypatch):
+    """Test a missing table renders the empty homepage instead of running DDL inside the request"""
+    monkeypatch.setitem(_featured_cache, 'data', None)
+    FeaturedSlot.__table__.drop(db.engine)
+    response = client.get('/')
+    assert response.status_code == 200
+    assert not db.inspect(db.engine).has_table('featured_slot')
+
+def test_hero_sprite_and_thumbnails(client, monkeypatch, tmp_path):
+    """Test hero avatars are packed into one sprite and uploads are served at srcset widths"""
+    from PIL import Image
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    filenames = []
+    for i, color in enumerate(['red', 'green', 'blue']):
+        filenames.append(f'test-sprite-{i}.jpg')
+        Image.new('RGB', (400, 300), color).save(os.path.join(app.config['UPLOAD_FOLDER'], filenames[-1]))
+        user = User(email=f'sprite{i}@example.com', full_name=f'Sprite Member {i}', user_type='member',
+                    photo_filename=filenames[-1])
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    
+    refresh_featured()
+    hero = FeaturedSlot.query.filter_by(slot='hero').all()
+    assert len({slot.sprite for slot in hero}) == 1
+    assert {slot.sprite_position for slot in hero} == {'0% 0%', '50% 0%', '100% 0%'}
+    
+    response = client.get('/')
+    assert response.data.count(f'/sprites/{hero[0].sprite}'.encode()) == 3
+    response = client.get(f'/sprites/{hero[0].sprite}')
+    assert Image.open(io.BytesIO(response.data)).size == (480, 160)
+    assert 'immutable' in response.headers['Cache-Control']
+    response.close()
+    
+    response = client.get(f'/uploads/{filenames[0]}?w=80')
+    assert Image.open(io.BytesIO(response.data)).size == (80, 60)
+    response.close()
+    
+    # A member leaving the hero row takes the shared sprite with them: their face is baked into it
+    remove_from_featured(hero[0].user_id)
+    db.session.commit()
+    assert client.get(f'/sprites/{hero[0].sprite}').status_code == 404
+    assert all(slot.sprite is None for slot in FeaturedSlot.query.filter_by(slot='hero'))
+    assert b'/sprites/' not in client.get('/').data
+    
+    # So does a photo change
+    refresh_featured()
+    slot = FeaturedSlot.query.filter_by(slot='hero').first()
+    user = db.session.get(User, slot.user_id)
+    sprite = slot.sprite
+    profile_changed.send(app, user=user, changes={'photo_filename': (user.photo_filename, 'new-photo.jpg')})
+    db.session.commit()
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'sprites', sprite))
+    assert slot.photo_filename == 'new-photo.jpg' and slot.sprite is None
+
+def test_anonymous_page_cache(client):
+    """Test anonymous pages are cached and purged on registration"""
+    assert client.get('/members').headers['X-Page-Cache'] == 'MISS'
+    assert client.get('/members').headers['X-Page-Cache'] == 'HIT'
+    assert client.get('/members?lang=uz').headers['X-Page-Cache'] == 'MISS'
+    
+    client.post('/register/member', data={
+        'email': 'cached@example.com',
+        'password': 'testpassword123',
+        'confirm_password': 'testpassword123',
+        'full_name': 'Cache Purge',
+        'university': 'Test University',
+        'university_country': 'Test Country',
+        'major': 'Test Major',
+        'start_date': '09-2020',
+        'end_date': '06-2024'
+    })
+    
+    # The flash message gives the visitor a session cookie, so the cache is bypassed
+    response = client.get('/members')
+    assert 'X-Page-Cache' not in response.headers
+    assert b'Cache Purge' in response.data
+    
+    # Once the flash is consumed the cookie is dropped and caching resumes
+    assert client.get_cookie('session') is None
+    assert client.get('/members').headers['X-Page-Cache'] == 'MISS'
+
+def test_page_cache_revalidation_and_cross_worker_purge(client, monkeypatch):
+    """Test revalidations skip the rate limiter and a purge in another worker clears this one's cache"""
+    monkeypatch.setattr(limiter, 'enabled', True)
+    limiter.reset()
+    key = ('/contact', '', 'en')
+    for _ in range(60):  # more than the default 50 per hour
+        page_cache.clear()
+        _revalidate_page(key)
+        assert page_cache.get(key) is not None
+    limiter.reset()
+    monkeypatch.setattr(limiter, 'enabled', False)
+    
+    monkeypatch.setitem(app.config, 'PAGE_CACHE_SYNC_INTERVAL', 0)
+    assert client.get('/members').headers['X-Page-Cache'] == 'MISS'
+    assert client.get('/members').headers['X-Page-Cache'] == 'HIT'
+    # Another worker's purge only reaches this one through the shared generation row
+    db.session.merge(SiteStat(name=PAGE_CACHE_GENERATION, value=(page_cache.generation or 0) + 1))
+    db.session.commit()
+    assert client.get('/members').headers['X-Page-Cache'] == 'MISS'
+    assert client.get('/members').headers['X-Page-Cache'] == 'HIT'
+
+def test_facet_counts(client):
+    """Test facet counts follow registration and deactivation"""
+    for i, country in enumerate(['Germany', 'Germany', 'Japan']):
+        client.post('/register/member', data={
+            'email': f'facet{i}@example.com',
+            'password': 'testpassword123',
+            'confirm_password': 'testpassword123',
+            'full_name': f'Facet Member {i}',
+            'university': 'Test University',
+            'university_country': country,
+            'major': 'Test Major',
+            'start_date': '09-2020',
+            'end_date': '06-2024'
+        })
+    assert db.session.get(FacetCount, ('university_country', 'Germany')).count == 2
+    assert db.session.get(FacetCount, ('university', 'Test University')).count == 3
+    
+    # Deactivating a member through the admin route decrements the counts; a rebuild agrees
+    login_admin(client)
+    user = User.query.filter_by(email='facet2@example.com').first()
+    client.post(f'/admin/user/{user.id}/toggle-status', follow_redirects=True)
+    db.session.expire_all()
+    assert db.session.get(FacetCount, ('university_country', 'Japan')) is None
+    assert db.session.get(FacetCount, ('university', 'Test University')).count == 2
+    client.post(f'/admin/user/{user.id}/toggle-status', follow_redirects=True)
+    db.session.expire_all()
+    assert db.session.get(FacetCount, ('university_country', 'Japan')).count == 1
+    client.post(f'/admin/user/{user.id}/toggle-status', follow_redirects=True)
+    audit_buffer.flush()
+    counts = {(row.facet, row.value): row.count for row in FacetCount.query.all()}
+    rebuild_facets()
+    assert {(row.facet, row.value): row.count for row in FacetCount.query.all()} == counts
+    
+    response = client.get('/members?university_country=Germany')
+    assert b'Facet Member 0' in response.data
+    assert b'Facet Member 2' not in response.data
+
+def test_country_normalization(client, monkeypatch):
+    """Test country spellings resolve to one ISO-keyed country across writes, backfill, stats and facets"""
+    load_countries()
+    for i, country in enumerate(['USA', 'united  states', 'U.S.A.']):
+        client.post('/register/member', data={
+            'email': f'country{i}@example.com',
+            'password': 'testpassword123',
+            'confirm_password': 'testpassword123',
+            'full_name': f'Country Member {i}',
+            'university': 'Test University',
+            'university_country': country,
+            'major': 'Test Major',
+            'start_date': '09-2020',
+            'end_date': '06-2024'
+        })
+    us = Country.query.filter_by(code='US').first()
+    members = User.query.filter(User.email.like('country%')).all()
+    assert {(user.university_country, user.university_country_id) for user in members} == {('United States', us.id)}
+    assert db.session.get(FacetCount, ('university_country', 'United States')).count == 3
+    
+    for name, country in [('legacy', 'uk'), ('unknown', 'Atlantis')]:
+        user = User(email=f'{name}@example.com', full_name=name.title(), user_type='member', university_country=country)
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    updated, unmatched = backfill_countries()
+    assert updated == 1 and unmatched == {'Atlantis': 1}
+    legacy = User.query.filter_by(email='legacy@example.com').first()
+    assert (legacy.university_country, legacy.university_country_id) == ('United Kingdom', Country.query.filter_by(code='GB').first().id)
+    
+    refresh_featured()
+    assert db.session.get(SiteStat, 'unique_countries').value == 3  # US, GB and the unrecognised 'Atlantis'
+    rebuild_facets()
+    assert db.session.get(FacetCount, ('university_country', 'United Kingdom')).count == 1
+    
+    response = client.get('/members?university_country=America')
+    assert b'Country Member 1' in response.data
+    assert b'Legacy' not in response.data
+    
+    # Typographic apostrophes are folded to ASCII rather than dropped
+    for spelling, code in [('O’zbekiston', 'UZ'), ('Oʻzbekiston', 'UZ'), ('Côte d’Ivoire', 'CI')]:
+        assert match_country(spelling)[0] == Country.query.filter_by(code=code).first().id
+    
+    # Aliases loaded by another process reach this worker once its index expires
+    db.session.add(CountryAlias(alias='murica', country_id=us.id))
+    db.session.commit()
+    assert match_country('Murica') == (None, 'Murica')
+    monkeypatch.setitem(app.config, 'COUNTRY_INDEX_TTL', 0)
+    assert match_country('Murica') == (us.id, 'United States')
+
+def test_sitemap_index_rebuilds_changed_chunks(client, monkeypatch, tmp_path):
+    """Test the sitemap index lists id-block children and only rewrites blocks whose profiles changed"""
+    monkeypatch.setattr('app.sitemap_dir', str(tmp_path))
+    monkeypatch.setitem(app.config, 'SITEMAP_URLS_PER_FILE', 2)
+    monkeypatch.setitem(app.config, 'SITEMAP_CHECK_INTERVAL', 0)
+    monkeypatch.setitem(_sitemaps, 'chunks', None)
+    users = []
+    for i, user_type in enumerate(['member', 'member', 'company', 'member', 'member']):
+        user = User(email=f'crawl{i}@example.com', full_name=f'Crawl {i}', user_type=user_type, is_active=i != 4)
+        user.set_password('testpassword123')
+        db.session.add(user)
+        users.append(user)
+    db.session.commit()
+    
+    ns = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
+    index = ET.fromstring(client.get('/sitemap.xml').data)
+    locations = set()
+    for child in index.findall('sm:sitemap', ns):
+        assert child.find('sm:lastmod', ns).text
+        response = client.get(child.find('sm:loc', ns).text.replace('http://localhost', ''))
+        assert response.status_code == 200
+        urls = ET.fromstring(response.data).findall('sm:url', ns)
+        assert 0 < len(urls) <= 2
+        locations |= {url.find('sm:loc', ns).text for url in urls}
+    assert f'http://localhost/company/{users[2].id}' in locations
+    assert f'http://localhost/member/{users[3].id}' in locations
+    assert f'http://localhost/member/{users[4].id}' not in locations  # inactive
+    
+    # Nothing changed: no child is rewritten; one edit rewrites only its block
+    with app.test_request_context():
+        assert refresh_sitemaps('http://localhost')[1] == 0
+        users[0].updated_at = users[0].updated_at.replace(year=users[0].updated_at.year + 1)
+        db.session.commit()
+        assert refresh_sitemaps('http://localhost')[1] == 1
+    assert b'Sitemap: http://localhost/sitemap.xml' in client.get('/robots.txt').data
+    
+    # In production a request's Host header never decides the URLs written to the shared files
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    monkeypatch.setitem(app.config, 'DEBUG', False)
+    monkeypatch.setitem(_sitemaps, 'chunks', None)
+    before = {path.name: path.read_bytes() for path in tmp_path.iterdir()}
+    assert client.get('/sitemap.xml', headers={'Host': 'evil.example'}).status_code == 404
+    assert b'Sitemap' not in client.get('/robots.txt', headers={'Host': 'evil.example'}).data
+    assert {path.name: path.read_bytes() for path in tmp_path.iterdir()} == before
+    monkeypatch.setitem(app.config, 'SITEMAP_BASE_URL', 'https://uzbekglobal.example')
+    index = client.get('/sitemap.xml', headers={'Host': 'evil.example'}).data
+    assert b'https://uzbekglobal.example/sitemaps/sitemap-0.xml' in index and b'evil' not in index
+
+def test_similar_members(client):
+    """Test similar members come from the precomputed index"""
+    profiles = [
+        ('alice', 'MIT', 'Physics', '09-2018', '06-2022'),
+        ('bob', 'MIT', 'Physics', '09-2019', '06-2023'),
+        ('carol', 'Oxford', 'History', '09-2010', '06-2013')
+    ]
+    for name, university, major, start, end in profiles:
+        user = User(email=f'{name}@example.com', full_name=name.title(), user_type='member',
+                    university=university, major=major, start_date=start, end_date=end)
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    rebuild_similar()
+    
+    alice = User.query.filter_by(email='alice@example.com').first()
+    ranked = SimilarMember.query.filter_by(user_id=alice.id).order_by(SimilarMember.rank).all()
+    assert [row.similar_user.full_name for row in ranked] == ['Bob']
+    
+    response = client.get(f'/member/{alice.id}')
+    assert b'Members you may know' in response.data
+    assert b'Bob' in response.data
+
+def test_study_periods_and_cohort_filter(client):
+    """Test study dates are validated, backfilled into typed columns and filterable by cohort"""
+    form = {
+        'email': 'late@example.com',
+        'password': 'testpassword123',
+        'confirm_password': 'testpassword123',
+        'full_name': 'Late',
+        'university': 'MIT',
+        'university_country': 'USA',
+        'major': 'CS',
+        'start_date': '09-2024',
+        'end_date': '06-2020'
+    }
+    response = client.post('/register/member', data=form)
+    assert b'Invalid study period' in response.data
+    assert User.query.filter_by(email='late@example.com').first() is None
+    
+    client.post('/register/member', data=dict(form, end_date='06-2026'))
+    late = User.query.filter_by(email='late@example.com').first()
+    assert (late.study_start.isoformat(), late.study_end.isoformat()) == ('2024-09-01', '2026-06-01')
+    
+    for name, start, end in [('legacy', '2019/09', '06-2026'), ('broken', 'autumn 2019', None)]:
+        user = User(email=f'{name}@example.com', full_name=name.title(), user_type='member', start_date=start, end_date=end)
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    updated, failures = backfill_study_periods()
+    assert updated == 1
+    broken = User.query.filter_by(email='broken@example.com').first()
+    assert failures == [(broken.id, 'start_date', 'autumn 2019')]
+    assert User.query.filter_by(email='legacy@example.com').first().study_end.year == 2026
+    
+    response = client.get('/members?graduating=2026')
+    assert b'Late' in response.data and b'Legacy' in response.data
+    assert b'Broken' not in response.data
+    response = client.get('/members?studied_to=2020')
+    assert b'Legacy' in response.data and b'Late' not in response.data
+
+def test_university_domain_match(client, monkeypatch):
+    """Test registration links members to a university by email domain"""
+    UniversityDomain.query.delete()  # the bundled dataset may already be loaded at startup
+    mit = University(name='Massachusetts Institute of Technology', country='United States')
+    db.session.add(mit)
+    db.session.flush()
+    db.session.add(UniversityDomain(domain='mit.edu', university_id=mit.id))
+    db.session.commit()
+    load_university_domain_index()
+    
+    assert match_university('student@mit.edu') == mit.id
+    assert match_university('student@cs.mit.edu') == mit.id
+    assert match_university('student@notmit.edu') is None
+    
+    client.post('/register/member', data={
+        'email': 'tim@csail.mit.edu',
+        'password': 'testpassword123',
+        'confirm_password': 'testpassword123',
+        'full_name': 'Tim',
+        'university': 'MIT',
+        'university_country': 'USA',
+        'major': 'CS',
+        'start_date': '09-2020',
+        'end_date': '06-2024'
+    })
+    assert User.query.filter_by(email='tim@csail.mit.edu').first().university_id == mit.id
+    
+    # Linked members are counted by university id, unlinked ones by the text they typed
+    legacy = User(email='old@mitalum.org', full_name='Legacy Tim', user_type='member', university='M.I.T.')
+    legacy.set_password('testpassword123')
+    db.session.add_all([legacy, UniversityDomain(domain='mitalum.org', university_id=mit.id)])
+    db.session.commit()
+    assert match_university('x@mitalum.org') is None
+    monkeypatch.setitem(app.config, 'UNIVERSITY_INDEX_TTL', 0)  # the worker reloads the index once it expires
+    assert match_university('x@mitalum.org') == mit.id
+    assert backfill_universities(batch_size=1) == 1 and legacy.university_id == mit.id
+    client.post('/register/member', data={
+        'email': 'gmail.tim@example.com', 'password': 'testpassword123', 'confirm_password': 'testpassword123',
+        'full_name': 'Gmail Tim', 'university': 'MIT', 'university_country': 'USA', 'major': 'CS',
+        'start_date': '09-2020', 'end_date': '06-2024'
+    })
+    rebuild_facets()
+    assert db.session.get(FacetCount, ('university_id', str(mit.id))).count == 2
+    assert db.session.get(FacetCount, ('university', 'MIT')).count == 1
+    response = client.get('/members')
+    assert f'href="/members?university_id={mit.id}"'.encode() in response.data
+    assert b'Massachusetts Institute of Technology' in response.data
+    response = client.get(f'/members?university_id={mit.id}')
+    assert b'Legacy Tim' in response.data and b'Gmail Tim' not in response.data
+    response = client.get('/members?university=MIT')
+    assert b'Gmail Tim' in response.data and b'Legacy Tim' not in response.data
+
+def test_uploaded_file_visibility(client, monkeypatch, tmp_path):
+    """Test uploads are served with range support and hidden for deactivated owners"""
+    # Same layout as the default config: uploads below the static folder
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    (tmp_path / 'uploads').mkdir()
+    filename = 'test-cv-visibility.pdf'
+    (tmp_path / 'uploads' / filename).write_bytes(b'%PDF-1.4 test document')
+    user = User(email='cv@example.com', full_name='CV Owner', user_type='member', cv_filename=filename)
+    user.set_password('testpassword123')
+    db.session.add(user)
+    db.session.commit()
+    
+    response = client.get(f'/uploads/{filename}', headers={'Range': 'bytes=0-7'})
+    assert response.status_code == 206
+    assert response.data == b'%PDF-1.4'
+    
+    monkeypatch.setitem(app.config, 'UPLOADS_ACCEL_REDIRECT', '/protected-uploads/')
+    response = client.get(f'/uploads/{filename}')
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/{filename}'
+    assert response.headers['Content-Type'] == 'application/pdf'
+    
+    assert response.headers['Cache-Control'].startswith('public')
+    
+    user.is_active = False
+    db.session.commit()
+    assert client.get(f'/uploads/{filename}').status_code == 404
+    # The file sits below the static folder, but its static URL gets the same visibility check
+    response = client.get(f'/static/uploads/{filename}')
+    assert response.status_code == 301 and response.headers['Location'].endswith(f'/uploads/{filename}')
+    assert client.get(f'/static/uploads/{filename}', follow_redirects=True).status_code == 404
+    assert client.get(f'/static//uploads/./{filename}', follow_redirects=True).status_code == 404
+    
+    # Admins still see the hidden file, but no shared cache may store it
+    login_admin(client)
+    response = client.get(f'/uploads/{filename}')
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/{filename}'
+    assert response.headers['Cache-Control'] == 'private, no-store'
+
+def login_admin(client):
+    """Create an admin user and log the test client in"""
+    admin = User(email='admin@example.com', full_name='Test Admin', user_type='member', is_admin=True)
+    admin.set_password('adminpassword123')
+    db.session.add(admin)
+    db.session.commit()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'adminpassword123'})
+    return admin
+
+def test_admin_users_keyset_pagination(client):
+    """Test the admin user list pages by id cursor"""
+    login_admin(client)
+    for i in range(25):
+        user = User(email=f'page{i:02d}@example.com', full_name=f'Paged User {i}', user_type='member')
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    
+    response = client.get('/admin/users?exact=1')
+    assert response.status_code == 200
+    assert User.query.count() >= 26
+    assert f'{User.query.count()} users'.encode() in response.data
+    
+    last_on_first_page = User.query.order_by(User.id).offset(19).first()
+    response = client.get('/admin/users', query_string={'after': encode_cursor(last_on_first_page.id, last_on_first_page.id)})
+    assert b'Paged User 24' in response.data
+    assert last_on_first_page.email.encode() not in response.data
+    assert b'Previous' in response.data
+
+def test_admin_users_filters_and_sort(client):
+    """Test the admin user list filters by email prefix and flags and sorts by name"""
+    login_admin(client)
+    for email, name, active in [('zed@alpha.com', 'Zed', True), ('amy@alpha.com', 'Amy', False), ('bob@beta.com', 'Bob', True)]:
+        user = User(email=email, full_name=name, user_type='member', is_active=active)
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    
+    response = client.get('/admin/users?email=ZED&is_active=1')
+    assert b'zed@alpha.com' in response.data
+    assert b'amy@alpha.com' not in response.data
+    assert b'bob@beta.com' not in response.data
+    
+    response = client.get('/admin/users?sort=name&dir=desc&name=')
+    body = response.data.decode()
+    assert body.index('zed@alpha.com') < body.index('bob@beta.com') < body.index('amy@alpha.com')
+
+def test_admin_users_sort_companies_by_name(client):
+    """Test paging by name reaches every company (registered with an empty full_name)"""
+    login_admin(client)
+    for i in range(25):
+        user = User(email=f'co{i:02d}@example.com', full_name='', company_name=f'Company {i:02d}', user_type='company')
+        user.set_password('testpassword123')
+        db.session.add(user)
+    db.session.commit()
+    
+    seen, after = [], None
+    for _ in range(5):
+        response = client.get('/admin/users', query_string=dict(sort='name', user_type='company', **({'after': after} if after else {})))
+        seen += re.findall(r'co(\d\d)@example\.com', response.data.decode())
+        match = re.search(r'href="([^"]*after=[^"]*)"', response.data.decode())
+        if not match:
+            break
+        after = parse_qs(urlsplit(html.unescape(match.group(1))).query)['after'][0]
+    assert seen == [f'{i:02d}' for i in range(25)]
+
+def test_audit_log_is_buffered(client):
+    """Test admin actions are buffered and written to the audit log in a batch"""
+    admin = login_admin(client)
+    user = User(email='audited@example.com', full_name='Audited User', user_type='member')
+    user.set_password('testpassword123')
+    db.session.add(user)
+    db.session.commit()
+    
+    audit_buffer.flush()
+    client.post(f'/admin/user/{user.id}/toggle-status')
+    client.post(f'/admin/user/{user.id}/make-admin')
+    audit_buffer.flush()
+    
+    events = AuditLog.query.filter_by(target_user_id=user.id).order_by(AuditLog.id).all()
+    assert [event.action for event in events] == ['user.deactivate', 'user.make_admin']
+    assert events[0].actor_id == admin.id
+    
+    response = client.get('/admin/audit?action=user.make_admin')
+    assert response.status_code == 200
+    assert b'user.make_admin' in response.data
+
+def test_profile_views_are_coalesced(client):
+    """Test profile views are counted in memory and flushed as one upsert per day"""
+    user = User(email='viewed@example.com', full_name='Viewed Member', user_type='member')
+    user.set_password('testpassword123')
+    db.session.add(user)
+    db.session.commit()
+    
+    view_counter.flush()
+    for _ in range(3):
+        client.get(f'/member/{user.id}')
+    response = client.get(f'/member/{user.id}')
+    assert b'4 views' in response.data
+    
+    view_counter.flush()
+    client.get(f'/member/{user.id}')
+    view_counter.flush()
+    rows = ProfileViewDaily.query.filter_by(user_id=user.id).all()
+    assert len(rows) == 1
+    assert rows[0].views == 5
+
+def test_profile_views_never_wait_for_a_flush(client, monkeypatch):
+    """Test a batch being written stays visible to readers, who never block on the flush"""
+    user = User(email='inflight@example.com', full_name='Inflight Member', user_type='member')
+    user.set_password('testpassword123')
+    db.session.add(user)
+    db.session.commit()
+    for _ in range(3):
+        view_counter.add(user.id)
+    
+    writing, release = threading.Event(), threading.Event()
+    def slow_statement():
+        writing.set()
+        release.wait(10)
+        return upsert_view_counts_statement()
+    monkeypatch.setattr('app.upsert_view_counts_statement', slow_statement)
+    flusher = threading.Thread(target=view_counter.flush)
+    flusher.start()
+    try:
+        assert writing.wait(10)
+        assert get_profile_views(user.id) == (3, 3)  # returns while the batch is in flight
+    finally:
+        release.set()
+        flusher.join(10)
+    assert not view_counter.inflight
+    assert get_profile_views(user.id) == (3, 3)
+
+def test_health_endpoints(client):
+    """Test liveness and readiness probes"""
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ok'}
+    
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['checks']['database']['ok'] is True
+    assert 'latency_ms' in data['checks']['database']
+    assert data['checks']['uploads']['ok'] is True
+
+def test_admin_request_profiler(client, monkeypatch, tmp_path):
+    """Test admins can capture a speedscope profile of a request"""
+    monkeypatch.setattr('app.profile_dir', str(tmp_path))
+    
+    # Anonymous visitors can't switch the profiler on
+    assert 'X-Profile-Id' not in client.get('/contact?_profile=1').headers
+    
+    login_admin(client)
+    response = client.get('/admin', headers={'X-Profile': '1'})
+    profile_id = response.headers['X-Profile-Id']
+    
+    response = client.get('/admin/profiles')
+    assert profile_id.encode() in response.data
+    
+    response = client.get(f'/admin/profiles/{profile_id}')
+    profile = json.loads(response.data)
+    assert profile['profiles'][0]['type'] == 'sampled'
+    assert len(profile['profiles'][0]['samples']) == len(profile['profiles'][0]['weights'])
+
+def test_sampled_profiles_skip_probes_and_hide_ids(client, monkeypatch, tmp_path):
+    """Test sampling never profiles health checks and never shows anonymous clients the profile id"""
+    monkeypatch.setattr('app.profile_dir', str(tmp_path))
+    monkeypatch.setitem(app.config, 'PROFILE_SAMPLE_RATE', 1)
+    
+    client.get('/healthz')
+    client.get('/readyz')
+    assert os.listdir(tmp_path) == []
+    
+    response = client.get('/contact')
+    assert len(os.listdir(tmp_path)) == 1
+    assert 'X-Profile-Id' not in response.headers
+
+def test_edit_profile_partial_update(client):
+    """Test profile edits write only changed fields, skip no-ops and reject stale versions"""
+    company = User(email='acme@example.com', company_name='Acme', user_type='company',
+                   company_country='Germany', industry='Retail')
+    company.set_password('testpassword123')
+    db.session.add(company)
+    db.session.commit()
+    rebuild_facets()
+    client.post('/login', data={'email': 'acme@example.com', 'password': 'testpassword123'})
+    
+    events = []
+    def record(sender, user, changes):
+        events.append(changes)
+    profile_changed.connect(record)
+    try:
+        form = {'company_name': 'Acme', 'company_country': 'Germany', 'industry': 'Retail', 'version': '1'}
+        client.post('/edit-profile', data=form)
+        assert events == []
+        assert db.session.get(User, company.id).version == 1
+        
+        client.post('/edit-profile', data=dict(form, industry='Logistics'))
+        assert events == [{'industry': ('Retail', 'Logistics')}]
+        assert db.session.get(FacetCount, ('industry', 'Logistics')).count == 1
+        assert db.session.get(FacetCount, ('industry', 'Retail')) is None
+        
+        # A second tab still holding version 1 must not overwrite the newer save
+        response = client.post('/edit-profile', data=dict(form, industry='Mining'), follow_redirects=True)
+        assert b'changed in another window' in response.data
+        db.session.expire_all()
+        assert db.session.get(User, company.id).industry == 'Logistics'
+        assert db.session.get(User, company.id).version == 2
+    finally:
+        profile_changed.disconnect(record)
+
+def test_visibility_changes_send_profile_changed(client):
+    """Test registration, deactivation and promotion go through the same profile_changed subscribers as edits"""
+    events = []
+    def record(sender, user, changes):
+        events.append((user.email, changes))
+    profile_changed.connect(record)
+    try:
+        client.post('/register/member', data={
+            'email': 'visible@example.com', 'password': 'testpassword123', 'confirm_password': 'testpassword123',
+            'full_name': 'Visible Member', 'university': 'Test University', 'university_country': 'Germany',
+            'major': 'Test Major', 'start_date': '09-2020', 'end_date': '06-2024'
+        })
+        user = User.query.filter_by(email='visible@example.com').first()
+        db.session.add(FeaturedSlot(slot='member', position=0, user_id=user.id))
+        db.session.commit()
+        login_admin(client)
+        client.post(f'/admin/user/{user.id}/toggle-status')
+        client.post(f'/admin/user/{user.id}/make-admin')
+        client.post(f'/admin/user/{user.id}/make-admin')  # already an admin: nothing changes
+        audit_buffer.flush()
+    finally:
+        profile_changed.disconnect(record)
+    
+    assert events == [('visible@example.com', {'is_active': (False, True)}),
+                      ('visible@example.com', {'is_active': (True, False)}),
+                      ('visible@example.com', {'is_admin': (False, True)})]
+    # The subscribers did the work the routes used to do by hand
+    assert FeaturedSlot.query.filter_by(user_id=user.id).count() == 0
+    assert db.session.get(FacetCount, ('university', 'Test University')) is None
+
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    """Minimal local SMTP server: accepts everything except recipients containing 'bounce'"""
+
+    def handle(self):
+        self.server.sessions += 1
+        self.wfile.write(b'220 localhost\r\n')
+        recipient = None
+        while True:
+            line = self.rfile.readline()
+            command = line[:4].upper()
+            if not line or command == b'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                break
+            reply = b'250 OK'
+            if command == b'RCPT':
+                recipient = line.split(b'<')[1].split(b'>')[0].decode()
+                if 'bounce' in recipient:
+                    reply = b'550 No such user'
+            elif command == b'DATA':
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                data = []
+                while (line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(line)
+                self.server.messages[recipient] = email.message_from_bytes(b''.join(data))
+            self.wfile.write(reply + b'\r\n')
+
+def test_broadcast_mailer(client, monkeypatch):
+    """Test broadcasts reuse one SMTP session per chunk, render per locale and record recipient status"""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStandIn)
+    server.sessions, server.messages = 0, {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state = app.extensions['mail']
+    for name, value in (('server', '127.0.0.1'), ('port', server.server_address[1]), ('use_tls', False),
+                        ('use_ssl', False), ('username', None), ('suppress', False), ('debug', 0)):
+        monkeypatch.setattr(state, name, value)
+    monkeypatch.setitem(app.config, 'MAIL_DEFAULT_SENDER', 'news@example.com')
+    monkeypatch.setitem(app.config, 'BROADCAST_CHUNK_SIZE', 2)
+    monkeypatch.setitem(app.config, 'BROADCAST_RATE_LIMIT', 0)
+    
+    for name, language, verified in [('ann', 'en', True), ('bek', 'uz', True), ('bounce', 'en', True),
+                                     ('dan', None, True), ('eve', 'en', False)]:
+        user = User(email=f'{name}@example.com', full_name=name.title(), user_type='member',
+                    language=language, is_verified=verified)
+        user.set_password('testpassword123')
+        db.session.add(user)
+    broadcast = Broadcast(subject='Meetup', body='Join us on Friday.', audience=json.dumps({'user_type': 'member', 'is_verified': '1', 'is_admin': '0'}))
+    db.session.add(broadcast)
+    db.session.commit()
+    
+    try:
+        assert run_broadcast(broadcast.id)
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    db.session.expire_all()
+    broadcast = db.session.get(Broadcast, broadcast.id)
+    assert (broadcast.status, broadcast.sent_count, broadcast.failed_count) == ('done', 3, 1)
+    assert server.sessions == 2  # four recipients in chunks of two
+    assert sorted(server.messages) == ['ann@example.com', 'bek@example.com', 'dan@example.com']
+    html = next(part for part in server.messages['bek@example.com'].walk() if part.get_content_type() == 'text/html')
+    html = html.get_payload(decode=True).decode()
+    assert "Uzbek Global Network'dan salom!" in html and 'Join us on Friday.' in html
+    failed = BroadcastRecipient.query.filter_by(broadcast_id=broadcast.id, status='failed').one()
+    assert db.session.get(User, failed.user_id).email == 'bounce@example.com'
+    
+    # A finished broadcast cannot be claimed again
+    assert not run_broadcast(broadcast.id)
+    
+    # Senders run out of process; broadcasts whose sender died are found again by 'flask resume-broadcasts'
+    spawned = []
+    monkeypatch.setattr('app.subprocess.Popen', lambda args, **kwargs: spawned.append(args))
+    start_broadcast(broadcast.id)
+    assert spawned[0][-2:] == ['send-broadcast', str(broadcast.id)]
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    stalled = Broadcast(subject='Stalled', body='.', audience='{}', status='sending', checkpoint_at=long_ago)
+    running = Broadcast(subject='Running', body='.', audience='{}', status='sending', checkpoint_at=datetime.utcnow())
+    orphaned = Broadcast(subject='Orphaned', body='.', audience='{}', created_at=long_ago)
+    db.session.add_all([stalled, running, orphaned])
+    db.session.commit()
+    assert stalled_broadcast_ids() == [stalled.id, orphaned.id]
+
+def test_spooled_body_middleware():
+    """Test the ASGI layer reads the whole body before the app runs and rejects oversized uploads"""
+    calls, incoming = [], []
+    
+    async def inner(scope, receive, send):
+        assert incoming == [], 'the app ran before the body was fully received'
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message['body'])
+            if not message['more_body']:
+                break
+        calls.append(b''.join(chunks))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+    
+    def serve(messages, headers=()):
+        incoming[:], sent = messages, []
+        
+        async def receive():
+            return incoming.pop(0) if incoming else {'type': 'http.disconnect'}
+        
+        async def send(message):
+            sent.append(message)
+        
+        middleware = SpooledBodyMiddleware(inner, max_body_size=1000, memory_size=16, chunk_size=7)
+        asyncio.run(middleware({'type': 'http', 'headers': list(headers)}, receive, send))
+        return sent
+    
+    body = [{'type': 'http.request', 'body': bytes([65 + i]) * 100, 'more_body': i < 2} for i in range(3)]
+    sent = serve(body)
+    assert calls == [b'A' * 100 + b'B' * 100 + b'C' * 100] and sent[0]['status'] == 200
+    
+    sent = serve([{'type': 'http.request', 'body': b'', 'more_body': False}])
+    assert calls[-1] == b'' and sent[0]['status'] == 200
+    
+    calls.clear()
+    assert serve([{'type': 'http.request', 'body': b'x' * 600, 'more_body': True}] * 2)[0]['status'] == 413
+    assert serve([], headers=[(b'content-length', b'5000')])[0]['status'] == 413
+    assert serve([{'type': 'http.request', 'body': b'x', 'more_body': True}]) == []  # client disconnected
+    assert calls == []
+
 if __name__ == '__main__':
     pytest.main([__file__])